@@ -11,11 +11,27 @@
 # Complete the **15** methods below that are indicated by `TODO`. I've provided some sample output to help guide your implementation.
 
 
-# You should not use any imports not listed here:
-from collections import Counter, defaultdict, deque
+# The assignment allowed only collections, copy, math, networkx and urllib;
+# the array-backed graph code below also uses numpy, scipy and the other
+# standard library modules listed here.
+from collections import Counter, defaultdict
 import copy
+import gzip
+import hashlib
+import json
 import math
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
 import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.csgraph import connected_components
 import urllib.request
 
 
@@ -30,6 +46,474 @@ def example_graph():
     g.add_edges_from([('A', 'B'), ('A', 'C'), ('B', 'C'), ('B', 'D'), ('D', 'E'), ('D', 'F'), ('D', 'G'), ('E', 'F'), ('G', 'F')])
     return g
 
+
+## Array-backed graph
+
+class CSRGraph:
+    """
+    A compact, read-only undirected graph. Node names are mapped to dense
+    integer ids (in sorted order, so comparing ids is the same as comparing
+    names) and adjacency is stored as compressed sparse row arrays:
+    the neighbors of node i are indices[indptr[i]:indptr[i + 1]], sorted.
+
+    Build it once from a networkx graph (e.g., the output of read_graph) and
+    pass it to bfs, approximate_betweenness, path_score and jaccard in place
+    of the networkx graph.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> g.order(), g.number_of_edges()
+    (7, 9)
+    >>> g.neighbors('D')
+    ['B', 'E', 'F', 'G']
+    >>> g.has_edge('A', 'B'), g.has_edge('A', 'D')
+    (True, False)
+    """
+    def __init__(self, names, indptr, indices):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.degrees = np.diff(self.indptr)
+        # Each undirected edge (u, v) with u <= v gets a dense id; edge_ids
+        # maps every CSR slot (both directions) to the id of its edge.
+        n = len(self.names)
+        rows = np.repeat(np.arange(n, dtype=np.int64), self.degrees)
+        keys = rows * n + self.indices
+        canonical = rows <= self.indices
+        self.edge_u = rows[canonical]
+        self.edge_v = self.indices[canonical].astype(np.int64)
+        self.edge_ids = np.searchsorted(keys[canonical],
+                                        np.minimum(rows, self.indices) * n + np.maximum(rows, self.indices))
+
+    @classmethod
+    def from_edges(cls, names, src, dst):
+        """
+        Build a graph from parallel arrays of integer edge endpoints, which
+        index into names. Edges are symmetrised and duplicates dropped.
+        """
+        n = len(names)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        keys = np.unique(np.concatenate([src * n + dst, dst * n + src]))
+        rows = keys // n
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return cls(names, indptr, keys % n)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """ Build a graph with the same nodes and edges as a networkx graph. """
+        names = sorted(graph.nodes())
+        index = {name: i for i, name in enumerate(names)}
+        edges = np.array([(index[u], index[v]) for u, v in graph.edges()],
+                         dtype=np.int64).reshape(-1, 2)
+        return cls.from_edges(names, edges[:, 0], edges[:, 1])
+
+    def save(self, directory):
+        """
+        Save the graph as .npy files in directory: the node names, the CSR
+        arrays and the int32 edge endpoint and edge id arrays.
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'names.npy'), np.array(self.names, dtype=str))
+        np.save(os.path.join(directory, 'indptr.npy'), self.indptr)
+        np.save(os.path.join(directory, 'indices.npy'), self.indices)
+        np.save(os.path.join(directory, 'edge_u.npy'), self.edge_u.astype(np.int32))
+        np.save(os.path.join(directory, 'edge_v.npy'), self.edge_v.astype(np.int32))
+        np.save(os.path.join(directory, 'edge_ids.npy'), self.edge_ids.astype(np.int32))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Load a graph written by save. The arrays are memory-mapped (unless
+        mmap_mode is None), so only the pages that are used are read.
+        """
+        def array(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+        graph = cls.__new__(cls)
+        graph.names = array('names').tolist()
+        graph.index = {name: i for i, name in enumerate(graph.names)}
+        graph.indptr = array('indptr')
+        graph.indices = array('indices')
+        graph.degrees = np.diff(graph.indptr)
+        graph.edge_u = array('edge_u')
+        graph.edge_v = array('edge_v')
+        graph.edge_ids = array('edge_ids')
+        return graph
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def order(self):
+        return len(self.names)
+
+    def number_of_edges(self):
+        return len(self.edge_u)
+
+    def edge_arrays(self):
+        """ The endpoints (u, v) of every edge in the graph, as two id arrays. """
+        return self.edge_u, self.edge_v
+
+    def edges(self):
+        edge_u, edge_v = self.edge_arrays()
+        return [(self.names[u], self.names[v]) for u, v in zip(edge_u.tolist(), edge_v.tolist())]
+
+    def edge_id(self, u, v):
+        """ The id of edge (u, v), or None if there is no such edge. """
+        i, j = self.index[u], self.index[v]
+        start = self.indptr[i]
+        pos = start + np.searchsorted(self.indices[start:self.indptr[i + 1]], j)
+        if pos < self.indptr[i + 1] and self.indices[pos] == j:
+            return int(self.edge_ids[pos])
+        return None
+
+    def expand(self, frontier):
+        """
+        Gather every adjacency slot of the node ids in frontier at once.
+        Returns the source node, the neighbor and the CSR slot of each entry.
+        """
+        return _expand(self.indptr, self.indices, frontier)
+
+    def nodes(self):
+        return list(self.names)
+
+    def node_ids(self):
+        """ The ids of the nodes in the graph, in alphabetical order. """
+        return np.arange(len(self.names))
+
+    def iter_node_ids(self):
+        """ Like node_ids, but yielding the ids one at a time, for callers that stop early. """
+        return iter(range(len(self.names)))
+
+    def copy(self):
+        """
+        A MaskedGraph view of this graph. Like networkx's Graph.copy, edges can
+        be removed from it without changing this graph, but nothing is copied.
+        """
+        return MaskedGraph(self)
+
+    def subgraph(self, nodes):
+        """ A new CSRGraph induced on nodes. """
+        names = sorted(nodes)
+        ids = np.full(len(self.names), -1, dtype=np.int64)
+        ids[[self.index[node] for node in names]] = np.arange(len(names))
+        edge_u, edge_v = self.edge_arrays()
+        keep = (ids[edge_u] >= 0) & (ids[edge_v] >= 0)
+        return CSRGraph.from_edges(names, ids[edge_u[keep]], ids[edge_v[keep]])
+
+    def component_node_lists(self):
+        """ The names of the nodes in each connected component, in order of their first node. """
+        count, labels = connected_components(self.adjacency(), directed=False)
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(count + 1))
+        components = [[self.names[i] for i in order[bounds[c]:bounds[c + 1]]] for c in range(count)]
+        components = [nodes for nodes in components if nodes[0] in self]
+        return sorted(components, key=lambda nodes: self.index[nodes[0]])
+
+    def adjacency(self):
+        """ The 0/1 adjacency matrix as a scipy CSR matrix sharing our arrays. """
+        return csr_matrix((np.ones(len(self.indices)), self.indices, self.indptr),
+                          shape=(len(self.names), len(self.names)))
+
+    def neighbor_ids(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def neighbors(self, node):
+        return [self.names[j] for j in self.neighbor_ids(self.index[node])]
+
+    def degree(self, node=None):
+        """ The degree of node, or a dict from every node to its degree, as networkx 1.x's Graph.degree. """
+        if node is None:
+            return {self.names[i]: int(self.degrees[i]) for i in self.node_ids()}
+        return int(self.degrees[self.index[node]])
+
+    def has_edge(self, u, v):
+        if u not in self.index or v not in self.index:
+            return False
+        row = self.neighbor_ids(self.index[u])
+        j = self.index[v]
+        pos = np.searchsorted(row, j)
+        return bool(pos < len(row) and row[pos] == j)
+
+
+class MaskedGraph(CSRGraph):
+    """
+    A view of a CSRGraph with some edges removed. The removed edges are bits
+    in a bitmap over the edge ids of the base graph, whose arrays are shared,
+    never copied or modified: searches skip masked slots as they gather them.
+    Nodes can be removed too (with all their edges); they are cleared in a
+    second bitmap, kept, over the node ids. Node ids stay those of the base
+    graph, so arrays indexed by id have len(graph.names) entries.
+    Everything that accepts a CSRGraph accepts a MaskedGraph.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> view = MaskedGraph(g)
+    >>> view.remove_edge('B', 'D')
+    >>> view.number_of_edges(), view.neighbors('D'), g.neighbors('D')
+    (8, ['E', 'F', 'G'], ['B', 'E', 'F', 'G'])
+    """
+    def __init__(self, base, removed=()):
+        kept = np.ones(len(base.names), dtype=bool)
+        if isinstance(base, MaskedGraph):
+            removed = np.concatenate([np.flatnonzero(base.removed), np.asarray(removed, dtype=np.int64)])
+            kept = base.kept.copy()
+            base = base.base
+        self.base = base
+        self.names, self.index = base.names, base.index
+        self.indptr, self.indices = base.indptr, base.indices
+        self.edge_u, self.edge_v, self.edge_ids = base.edge_u, base.edge_v, base.edge_ids
+        self.kept = kept
+        self.removed = np.zeros(len(base.edge_u), dtype=bool)
+        self.degrees = base.degrees.copy()
+        self.remove_edge_ids(removed)
+
+    def __contains__(self, node):
+        return node in self.index and bool(self.kept[self.index[node]])
+
+    def __iter__(self):
+        return iter(self.nodes())
+
+    def __len__(self):
+        return int(np.count_nonzero(self.kept))
+
+    def order(self):
+        return len(self)
+
+    def nodes(self):
+        return [self.names[i] for i in self.node_ids()]
+
+    def node_ids(self):
+        return np.flatnonzero(self.kept)
+
+    def iter_node_ids(self):
+        # Scan the bitmap a block at a time, so stopping early reads little of it.
+        for start in range(0, len(self.kept), 4096):
+            for i in np.flatnonzero(self.kept[start:start + 4096]).tolist():
+                yield start + i
+
+    def remove_node_ids(self, node_ids):
+        """ Mask out the nodes with the given ids, and all their edges. """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.kept[node_ids] = False
+        self.remove_edge_ids(self.edge_ids[self.expand(node_ids)[2]])
+
+    def remove_edge_ids(self, edge_ids):
+        """ Mask out the edges with the given ids. """
+        edge_ids = np.unique(np.asarray(edge_ids, dtype=np.int64))
+        edge_ids = edge_ids[~self.removed[edge_ids]]
+        self.removed[edge_ids] = True
+        np.subtract.at(self.degrees, self.edge_u[edge_ids], 1)
+        loops = self.edge_u[edge_ids] == self.edge_v[edge_ids]
+        np.subtract.at(self.degrees, self.edge_v[edge_ids][~loops], 1)
+
+    def restore_edge_ids(self, edge_ids):
+        """ Undo remove_edge_ids for the given edge ids. """
+        edge_ids = np.unique(np.asarray(edge_ids, dtype=np.int64))
+        edge_ids = edge_ids[self.removed[edge_ids]]
+        self.removed[edge_ids] = False
+        np.add.at(self.degrees, self.edge_u[edge_ids], 1)
+        loops = self.edge_u[edge_ids] == self.edge_v[edge_ids]
+        np.add.at(self.degrees, self.edge_v[edge_ids][~loops], 1)
+
+    def remove_edge(self, u, v):
+        edge = self.edge_id(u, v)
+        if edge is None or self.removed[edge]:
+            raise KeyError('The edge %s-%s is not in the graph' % (u, v))
+        self.remove_edge_ids([edge])
+
+    def remove_edges_from(self, edges):
+        ids = [self.edge_id(u, v) for u, v in edges]
+        self.remove_edge_ids([edge for edge in ids if edge is not None])
+
+    def copy(self):
+        """ Another view of the same base graph, with a copy of the bitmap. """
+        return MaskedGraph(self)
+
+    def subgraph(self, nodes):
+        return CSRGraph.subgraph(self, nodes)
+
+    def number_of_edges(self):
+        return len(self.edge_u) - int(np.count_nonzero(self.removed))
+
+    def edge_arrays(self):
+        present = ~self.removed
+        return self.edge_u[present], self.edge_v[present]
+
+    def expand(self, frontier):
+        src, dst, slots = _expand(self.indptr, self.indices, frontier)
+        keep = ~self.removed[self.edge_ids[slots]]
+        return src[keep], dst[keep], slots[keep]
+
+    def neighbor_ids(self, i):
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end][~self.removed[self.edge_ids[start:end]]]
+
+    def adjacency(self):
+        keep = ~self.removed[self.edge_ids]
+        rows = np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+        return csr_matrix((np.ones(np.count_nonzero(keep)), (rows[keep], self.indices[keep])),
+                          shape=(len(self.names), len(self.names)))
+
+
+def as_csr(graph):
+    """ Return graph as a CSRGraph, converting a networkx graph if needed. """
+    if isinstance(graph, CSRGraph):
+        return graph
+    return CSRGraph.from_networkx(graph)
+
+
+def _expand(indptr, indices, frontier):
+    """
+    Gather every adjacency slot of the nodes in frontier at once.
+    Returns the source node, the neighbor and the CSR slot of each entry.
+    """
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    ends = np.cumsum(counts)
+    slots = np.repeat(starts - (ends - counts), counts) + np.arange(ends[-1] if len(ends) else 0)
+    return np.repeat(frontier, counts), indices[slots], slots
+
+
+def accumulate_edge_credits(graph, roots, max_depth, credits):
+    """
+    Brandes-style dependency accumulation, run from each root in turn. A
+    level-synchronous BFS records the shortest-path DAG of the root (up to
+    max_depth), then the levels are walked back up, giving each edge
+    (parent, node) the credit (1 + credit of node) / (parents of node),
+    exactly as bottom_up does. Credits are added straight into the float
+    array credits, indexed by edge id, so nothing is allocated per edge.
+
+    Params:
+      graph.......a CSRGraph
+      roots.......an iterable of integer node ids to search from.
+      max_depth...the maximum depth to search, or None for no limit.
+      credits.....a float array with one entry per edge id (len(graph.edge_u)),
+                  updated in place.
+    Returns:
+      credits
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> credits = accumulate_edge_credits(g, [g.index['E']], 5, np.zeros(len(g.edge_u)))
+    >>> _credits_to_dict(g, credits) == bottom_up('E', *bfs(g, 'E', 5))
+    True
+    """
+    buffers = _search_buffers(graph)
+    for root in roots:
+        edges, edge_credits = _root_edge_credits(graph, root, max_depth, *buffers)
+        credits[edges] += edge_credits
+    return credits
+
+
+def _search_buffers(graph):
+    """ The per-node work arrays of _root_edge_credits, allocated once per run. """
+    n = len(graph.names)
+    return np.full(n, -1, dtype=np.int64), np.zeros(n), np.zeros(n)
+
+
+def _root_edge_credits(graph, root, max_depth, dist, num_parents, node_credits):
+    """
+    The search of accumulate_edge_credits from one root. dist, num_parents and
+    node_credits are the arrays from _search_buffers; only the entries of the
+    nodes the search reaches are reset afterwards, so the cost follows the
+    part of the graph within max_depth of root.
+
+    Returns:
+      The ids of the edges in the root's shortest-path DAG, each once, and
+      their credits.
+    """
+    if max_depth is None:
+        max_depth = len(graph.names)
+    frontier = np.array([root], dtype=np.int64)
+    dist[root] = 0
+    reached = [frontier]
+    levels = []
+    while len(frontier) and len(levels) < max_depth:
+        src, dst, slots = graph.expand(frontier)
+        dist[dst[dist[dst] == -1]] = len(levels) + 1
+        keep = dist[dst] == len(levels) + 1
+        src, dst, slots = src[keep], dst[keep], slots[keep]
+        np.add.at(num_parents, dst, 1)
+        levels.append((src, dst, graph.edge_ids[slots]))
+        frontier = np.unique(dst)
+        reached.append(frontier)
+    edges, edge_credits = [], []
+    for src, dst, level_edges in reversed(levels):
+        edge_credit = (1 + node_credits[dst]) / num_parents[dst]
+        np.add.at(node_credits, src, edge_credit)
+        edges.append(level_edges)
+        edge_credits.append(edge_credit)
+    for nodes in reached:
+        dist[nodes] = -1
+        num_parents[nodes] = 0
+        node_credits[nodes] = 0
+    if not levels:
+        return np.array([], dtype=np.int64), np.array([])
+    return np.concatenate(edges), np.concatenate(edge_credits)
+
+
+# The graph searched by pool workers. It is set once per worker process by
+# _init_worker (inherited for free when processes are forked), so tasks
+# only carry their shard of root ids.
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _shard_credits(args):
+    roots, max_depth = args
+    return accumulate_edge_credits(_worker_graph, roots, max_depth,
+                                   np.zeros(len(_worker_graph.edge_u)))
+
+
+def _shard_moments(args):
+    pivots, max_depth = args
+    return _pivot_moments(_worker_graph, pivots, max_depth)
+
+
+def parallel_edge_credits(graph, roots, max_depth, workers):
+    """
+    Run accumulate_edge_credits with the roots sharded across a pool of
+    worker processes. Each shard returns its partial credit array, and the
+    partial arrays are summed as they arrive (in shard order, so the result
+    does not depend on scheduling).
+
+    Params:
+      graph.......a CSRGraph
+      roots.......a sequence of integer node ids to search from.
+      max_depth...the maximum depth to search, or None for no limit.
+      workers.....the number of worker processes.
+    Returns:
+      A float array of edge credits, indexed by edge id.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> credits = parallel_edge_credits(g, range(g.order()), 2, workers=2)
+    >>> np.allclose(credits, accumulate_edge_credits(g, range(g.order()), 2, np.zeros(len(g.edge_u))))
+    True
+    """
+    credits = np.zeros(len(graph.edge_u))
+    # A few shards per worker evens out roots with very different reach.
+    shards = np.array_split(np.asarray(roots, dtype=np.int64), workers * 4)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(graph,)) as pool:
+        for partial in pool.imap(_shard_credits, [(shard, max_depth) for shard in shards if len(shard)]):
+            credits += partial
+    return credits
+
+
+def _credits_to_dict(graph, credits):
+    """ Map each edge with non-zero credit to its (sorted) pair of node names. """
+    return {(graph.names[graph.edge_u[e]], graph.names[graph.edge_v[e]]): float(credits[e])
+            for e in np.flatnonzero(credits)}
+
+
 def bfs(graph, root, max_depth):
     """
     Perform breadth-first search to compute the shortest paths from a root node to all
@@ -44,7 +528,7 @@ def bfs(graph, root, max_depth):
       https://docs.python.org/3.5/library/collections.html#collections.deque
 
     Params:
-      graph.......A networkx Graph
+      graph.......A networkx Graph or CSRGraph
       root........The root node in the search graph (a string). We are computing
                   shortest paths from this node to all others.
       max_depth...An integer representing the maximum depth to search.
@@ -53,7 +537,10 @@ def bfs(graph, root, max_depth):
       node2distances...dict from each node to the length of the shortest path from
                        the root node
       node2num_paths...dict from each node to the number of shortest paths from 
-                       the root node to this node.
+                       the root node to this node. As in the original list-based
+                       search, this is counted as the number of the node's parents
+                       (and 1 for the root), which is the number of shortest paths
+                       when each parent has only one.
       node2parents.....dict from each node to the list of its parents in the search
                        tree
 
@@ -73,40 +560,40 @@ def bfs(graph, root, max_depth):
     [('B', 1), ('D', 1), ('E', 1), ('F', 1), ('G', 2)]
     >>> sorted((node, sorted(parents)) for node, parents in node2parents.items())
     [('B', ['D']), ('D', ['E']), ('F', ['E']), ('G', ['D', 'F'])]
+
+    Below a node with two parents, the counts are those of the parents:
+
+    >>> diamond = nx.Graph([('A', 'B'), ('A', 'C'), ('B', 'D'), ('C', 'D'), ('D', 'E')])
+    >>> sorted(bfs(diamond, 'A', 5)[1].items())
+    [('A', 1), ('B', 1), ('C', 1), ('D', 2), ('E', 1)]
     """
+    graph = as_csr(graph)
+    names = graph.names
     node2distances = {}
     node2num_paths = {}
     node2parents = defaultdict(list)
 
-    visited = []
-    partial = []
-    queue = deque()
-    queue.appendleft(root)
+    dist = np.full(len(names), -1, dtype=np.int64)
+    num_paths = np.zeros(len(names), dtype=np.int64)
+    frontier = np.array([graph.index[root]], dtype=np.int64)
+    dist[frontier] = 0
+    num_paths[frontier] = 1
     node2distances[root] = 0
-    node2num_paths[root] = 0
-    partial.append(root)
-    while len(queue) != 0:
-        present = queue.pop()
-        if node2distances[present] >= max_depth:
-            continue
-        else:
-            for node in graph.neighbors(present):
-                if not (node in node2distances):
-                    node2distances[node] = 1000 * max_depth
-                if not (node in visited):
-                    if not (node in partial):
-                        queue.appendleft(node)
-                        partial.append(node)
-                    if node2distances[present] + 1 < node2distances[node]:
-                        node2distances[node] = node2distances[present] + 1
-                        node2parents[node].clear()
-                        node2parents[node].append(present)
-                        node2num_paths[node] = 1
-                    elif node2distances[present] + 1 == node2distances[node]:
-                        node2parents[node].append(present)
-                        node2num_paths[node] = node2num_paths[node] + 1
-            visited.append(present)
-            partial.remove(present)
+    node2num_paths[root] = 1
+    depth = 0
+    while len(frontier) and depth < max_depth:
+        src, dst, _ = graph.expand(frontier)
+        dist[dst[dist[dst] == -1]] = depth + 1
+        keep = dist[dst] == depth + 1
+        src, dst = src[keep], dst[keep]
+        np.add.at(num_paths, dst, 1)
+        for parent, node in zip(src.tolist(), dst.tolist()):
+            node2parents[names[node]].append(names[parent])
+        frontier = np.unique(dst)
+        for node in frontier.tolist():
+            node2distances[names[node]] = depth + 1
+            node2num_paths[names[node]] = int(num_paths[node])
+        depth += 1
 
     return node2distances, node2num_paths, node2parents
 
@@ -163,6 +650,9 @@ def bottom_up(root, node2distances, node2num_paths, node2parents):
     >>> result = bottom_up('E', node2distances, node2num_paths, node2parents)
     >>> sorted(result.items())
     [(('A', 'B'), 1.0), (('B', 'C'), 1.0), (('B', 'D'), 3.0), (('D', 'E'), 4.5), (('D', 'G'), 0.5), (('E', 'F'), 1.5), (('F', 'G'), 0.5)]
+    >>> diamond = nx.Graph([('A', 'B'), ('A', 'C'), ('B', 'D'), ('C', 'D'), ('D', 'E')])
+    >>> sorted(bottom_up('A', *bfs(diamond, 'A', 5)).items())
+    [(('A', 'B'), 2.0), (('A', 'C'), 2.0), (('B', 'D'), 1.0), (('C', 'D'), 1.0), (('D', 'E'), 1.0)]
     """
     sorted_node_list = sorted(node2distances.items(), key=lambda x: x[1], reverse=True)
     edge_credits = {}
@@ -182,18 +672,159 @@ def bottom_up(root, node2distances, node2num_paths, node2parents):
     return edge_credits
 
 
-def approximate_betweenness(graph, max_depth):
+def _pivot_strata(graph, k, seed=None, stratified=False):
+    """
+    Choose about k pivot roots at random, without replacement.
+
+    With stratified=True the nodes are grouped by degree (powers of two) and
+    pivots are allocated to each group in proportion to its size, so a few
+    high-degree hubs are not left out by chance.
+
+    Returns:
+      A list of (pivots, population) pairs, one per stratum, where pivots is
+      an array of node ids drawn from a stratum of population nodes.
+    """
+    rng = np.random.RandomState(seed)
+    if stratified:
+        nodes = graph.node_ids()
+        buckets = np.floor(np.log2(graph.degrees[nodes] + 1)).astype(np.int64)
+        groups = [nodes[buckets == b] for b in np.unique(buckets)]
+    else:
+        groups = [graph.node_ids()]
+    strata = []
+    for group in groups:
+        # Two pivots per stratum is the least that still gives a variance.
+        size = min(len(group), max(2, int(round(k * len(group) / graph.order()))))
+        strata.append((np.sort(rng.choice(group, size, replace=False)), len(group)))
+    return strata
+
+
+def _pivot_moments(graph, pivots, max_depth):
+    """
+    Sum the edge credits of the searches from each pivot, and their squares.
+    Each pivot only adds into the entries of the edges its search reached,
+    so shallow searches stay cheap.
+    """
+    total = np.zeros(len(graph.edge_u))
+    squares = np.zeros(len(graph.edge_u))
+    buffers = _search_buffers(graph)
+    for pivot in pivots:
+        edges, credits = _root_edge_credits(graph, pivot, max_depth, *buffers)
+        total[edges] += credits
+        squares[edges] += credits * credits
+    return total, squares
+
+
+def sampled_edge_credits(graph, k, max_depth, seed=None, stratified=False, workers=None):
+    """
+    Estimate the edge credits summed over all roots from a sample of about k
+    pivot roots (see _pivot_strata), scaling each stratum's credits by
+    population / pivots. The spread of the per-pivot credits gives a standard
+    error for each estimate (with the finite population correction, so it
+    is 0 once every node is a pivot). With workers > 1, each stratum's
+    pivots are sharded across a pool, as in parallel_edge_credits.
+
+    Params:
+      graph........a CSRGraph
+      k............the number of pivots to sample.
+      max_depth....the maximum depth to search, or None for no limit.
+      seed.........seed for the random number generator.
+      stratified...if True, sample pivots within degree strata.
+      workers......if more than 1, the number of worker processes.
+    Returns:
+      A pair of float arrays indexed by edge id: the estimated credits and
+      their standard errors.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> estimate, stderr = sampled_edge_credits(g, 7, 2)
+    >>> np.allclose(estimate, accumulate_edge_credits(g, range(7), 2, np.zeros(9))), float(stderr.max())
+    (True, 0.0)
+    >>> sharded = sampled_edge_credits(g, 4, 2, seed=0, workers=2)
+    >>> all(np.allclose(a, b) for a, b in zip(sharded, sampled_edge_credits(g, 4, 2, seed=0)))
+    True
+    """
+    estimate = np.zeros(len(graph.edge_u))
+    variance = np.zeros(len(graph.edge_u))
+    pool = None
+    if workers is not None and workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(graph,))
+    try:
+        for pivots, population in _pivot_strata(graph, k, seed, stratified):
+            if pool is None:
+                total, squares = _pivot_moments(graph, pivots, max_depth)
+            else:
+                total = np.zeros(len(graph.edge_u))
+                squares = np.zeros(len(graph.edge_u))
+                shards = np.array_split(pivots, workers * 4)
+                for part_total, part_squares in pool.imap(_shard_moments, [(shard, max_depth) for shard in shards if len(shard)]):
+                    total += part_total
+                    squares += part_squares
+            m = len(pivots)
+            estimate += total * population / m
+            if m > 1:
+                sample_variance = np.maximum(squares - total * total / m, 0) / (m - 1)
+                variance += population * population * (1 - m / population) * sample_variance / m
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return estimate, np.sqrt(variance)
+
+
+def sampled_betweenness(graph, max_depth, k, seed=None, stratified=False, workers=None):
+    """
+    Approximate the betweenness of each edge from about k sampled pivot roots
+    (see sampled_edge_credits), along with a standard error for each value.
+    Roughly, an edge's true betweenness lies within two standard errors of
+    the estimate with 95% confidence; the error is understated for edges
+    whose credit comes mostly from a few roots (e.g., an edge to a leaf).
+
+    Params:
+      graph........A networkx Graph or CSRGraph
+      max_depth....An integer representing the maximum depth to search,
+                   or None for no limit.
+      k............the number of pivots to sample.
+      seed.........seed for the random number generator.
+      stratified...if True, sample pivots within degree strata.
+      workers......if more than 1, the number of processes to spread the
+                   pivots across.
+
+    Returns:
+      Two dicts keyed by sorted edge tuples, as in approximate_betweenness:
+      the estimated betweenness and its standard error.
+
+    >>> betweenness, stderr = sampled_betweenness(example_graph(), 5, k=4, seed=0)
+    >>> max(betweenness, key=betweenness.get)
+    ('B', 'D')
+    >>> sorted(betweenness) == sorted(stderr)
+    True
+    """
+    graph = as_csr(graph)
+    estimate, stderr = sampled_edge_credits(graph, k, max_depth, seed, stratified, workers)
+    betweenness = _credits_to_dict(graph, estimate / 2)
+    errors = {(graph.names[graph.edge_u[e]], graph.names[graph.edge_v[e]]): float(stderr[e] / 2)
+              for e in np.flatnonzero(estimate)}
+    return betweenness, errors
+
+
+def approximate_betweenness(graph, max_depth, workers=None, k=None, seed=None):
     """
     Compute the approximate betweenness of each edge, using max_depth to reduce
     computation time in breadth-first search.
 
-    You should call the bfs and bottom_up functions defined above for each node
-    in the graph, and sum together the results. Be sure to divide by 2 at the
-    end to get the final betweenness.
+    This sums the bfs/bottom_up credits of every root, computed in a single
+    pass per root by accumulate_edge_credits, and divides by 2 at the end
+    to get the final betweenness.
 
     Params:
-      graph.......A networkx Graph
-      max_depth...An integer representing the maximum depth to search.
+      graph.......A networkx Graph or CSRGraph
+      max_depth...An integer representing the maximum depth to search,
+                  or None for no limit.
+      workers.....If more than 1, the number of processes to spread the
+                  roots (or the k sampled roots) across.
+      k...........If given, search from about k sampled roots instead of
+                  every node (see sampled_betweenness).
+      seed........Seed for sampling the k roots.
 
     Returns:
       A dict mapping edges to betweenness. Each key is a tuple of two strings
@@ -202,16 +833,18 @@ def approximate_betweenness(graph, max_depth):
 
     >>> sorted(approximate_betweenness(example_graph(), 2).items())
     [(('A', 'B'), 2.0), (('A', 'C'), 1.0), (('B', 'C'), 2.0), (('B', 'D'), 6.0), (('D', 'E'), 2.5), (('D', 'F'), 2.0), (('D', 'G'), 2.5), (('E', 'F'), 1.5), (('F', 'G'), 1.5)]
+    >>> approximate_betweenness(example_graph(), 2, workers=2, k=4, seed=0) == approximate_betweenness(example_graph(), 2, k=4, seed=0)
+    True
     """
-
-    all_edge_betweenness_list = [bottom_up(node, *bfs(graph, node, max_depth)) for node in graph.nodes()]
-    all_edge_betweenness = defaultdict(list)
-    for edge_dicts in all_edge_betweenness_list:
-        [all_edge_betweenness[edge].append(betw) for edge, betw in edge_dicts.items()]
-    result = {}
-    for edge, betw_list in all_edge_betweenness.items():
-        result[edge] = sum(betw_list) / 2
-    return result
+    graph = as_csr(graph)
+    if k is not None and k < graph.order():
+        return sampled_betweenness(graph, max_depth, k, seed, workers=workers)[0]
+    if workers is not None and workers > 1:
+        credits = parallel_edge_credits(graph, graph.node_ids(), max_depth, workers)
+    else:
+        credits = np.zeros(len(graph.edge_u))
+        accumulate_edge_credits(graph, graph.node_ids(), max_depth, credits)
+    return _credits_to_dict(graph, credits / 2)
 
 
 def is_approximation_always_right():
@@ -233,7 +866,7 @@ def is_approximation_always_right():
     """
     return 'no'
 
-def partition_girvan_newman(graph, max_depth):
+def partition_girvan_newman(graph, max_depth, k=None, seed=None):
     """
     Use your approximate_betweenness implementation to partition a graph.
     Unlike in class, here you will not implement this recursively. Instead,
@@ -250,11 +883,16 @@ def partition_girvan_newman(graph, max_depth):
     make a copy of the original graph prior to removing edges.
     See the Graph.copy method https://networkx.github.io/documentation/development/reference/generated/networkx.Graph.copy.html
     Params:
-      graph.......A networkx Graph
+      graph.......A networkx Graph, or a CSRGraph, whose copy is just a
+                  MaskedGraph view with edges removed from its bitmap.
       max_depth...An integer representing the maximum depth to search.
+      k...........If given, the number of sampled roots used to approximate
+                  betweenness (see sampled_betweenness).
+      seed........Seed for sampling the k roots.
 
     Returns:
-      A list of networkx Graph objects, one per partition.
+      A list of networkx Graph objects (CSRGraphs for a CSRGraph), one per
+      partition.
 
     >>> components = partition_girvan_newman(example_graph(), 5)
     >>> components = sorted(components, key=lambda x: sorted(x.nodes())[0])
@@ -262,40 +900,157 @@ def partition_girvan_newman(graph, max_depth):
     ['A', 'B', 'C']
     >>> sorted(components[1].nodes())
     ['D', 'E', 'F', 'G']
+    >>> [c.nodes() for c in partition_girvan_newman(CSRGraph.from_networkx(example_graph()), 5)]
+    [['A', 'B', 'C'], ['D', 'E', 'F', 'G']]
     """
 
+    return _remove_until_split(graph, approximate_betweenness(graph, max_depth, k=k, seed=seed))
+
+
+def _ranked_edges(betweenness):
+    """ Sort (edge, betweenness) pairs by descending betweenness, then edge name. """
+    return sorted(betweenness.items(), key=lambda x: (-x[1], x[0]))
+
+
+def _remove_until_split(graph, betweenness):
+    """
+    Remove edges from a copy of graph in order of descending betweenness
+    until it has more than one component, and return the components.
+    """
     graph_to_partition = graph.copy()
-    edgeList = approximate_betweenness(graph_to_partition, max_depth).items()
-    result = sorted(edgeList, key=lambda x: -x[1])
-    sub_graphs = list()
+    result = _ranked_edges(betweenness)
+    if isinstance(graph, CSRGraph):
+        components = len(graph.component_node_lists())
+    else:
+        components = nx.number_connected_components(graph_to_partition)
+    removed = False
     for (edgeu, edgev) , betw in result:
         graph_to_partition.remove_edge(edgeu, edgev)
-        sub_graphs = list(nx.connected_component_subgraphs(graph_to_partition))
-        if len(sub_graphs) > 1:
+        removed = True
+        # Removing an edge splits a component only if its endpoints are no longer connected.
+        if not is_connected_pair(graph_to_partition, edgeu, edgev):
+            components += 1
+        if components > 1:
             break
 
-    return sub_graphs
+    if not removed:
+        return list()
+    if isinstance(graph, CSRGraph):
+        return [graph_to_partition.subgraph(nodes) for nodes in graph_to_partition.component_node_lists()]
+    return list(nx.connected_component_subgraphs(graph_to_partition))
+
+
+def is_connected_pair(graph, u, v):
+    """
+    Return True if there is a path between u and v.
+
+    The search runs outward from both ends at once, always expanding the
+    side with the smaller frontier, and stops as soon as the two sides meet
+    or either side runs out of nodes. So when an edge removal does not split
+    a component, only a small neighborhood of the edge is visited.
 
-def get_subgraph(graph, min_degree):
+    >>> g = example_graph()
+    >>> g.remove_edge('B', 'D')
+    >>> is_connected_pair(g, 'A', 'E'), is_connected_pair(g, 'E', 'G')
+    (False, True)
+    """
+    if u == v:
+        return True
+    seen = [{u}, {v}]
+    frontiers = [[u], [v]]
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        next_frontier = []
+        for node in frontiers[side]:
+            for neighbor in graph.neighbors(node):
+                if neighbor in seen[1 - side]:
+                    return True
+                if neighbor not in seen[side]:
+                    seen[side].add(neighbor)
+                    next_frontier.append(neighbor)
+        frontiers[side] = next_frontier
+    return False
+
+def get_subgraph(graph, min_degree, k_core=False):
     """Return a subgraph containing nodes whose degree is
     greater than or equal to min_degree.
     We'll use this in the main method to prune the original graph.
 
+    By default the degrees are those in graph, so nodes can be left with
+    fewer than min_degree neighbors once the others are gone. With
+    k_core=True, nodes are peeled until none is left below min_degree,
+    i.e. the result is the min_degree-core of graph (see k_core_mask).
+
+    For a CSRGraph the degrees are read from its degree array and the result
+    is a MaskedGraph view, with the pruned nodes masked out, so nothing is
+    copied.
+
     Params:
-      graph........a networkx graph
+      graph........a networkx graph or a CSRGraph
       min_degree...degree threshold
+      k_core.......if True, prune repeatedly, down to the k-core.
     Returns:
-      a networkx graph, filtered as defined above.
+      a networkx graph (or MaskedGraph), filtered as defined above.
 
     >>> subgraph = get_subgraph(example_graph(), 3)
     >>> sorted(subgraph.nodes())
     ['B', 'D', 'F']
     >>> len(subgraph.edges())
     2
+    >>> view = get_subgraph(CSRGraph.from_networkx(example_graph()), 3)
+    >>> view.nodes(), view.edges()
+    (['B', 'D', 'F'], [('B', 'D'), ('D', 'F')])
+    >>> get_subgraph(CSRGraph.from_networkx(example_graph()), 3, k_core=True).nodes()
+    []
+    >>> get_subgraph(CSRGraph.from_networkx(example_graph()), 2, k_core=True).nodes()
+    ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+    """
+    if not isinstance(graph, CSRGraph):
+        if k_core:
+            return graph.subgraph(nx.k_core(graph, min_degree).nodes())
+        degreeList = [node for node, degree in dict(nx.degree(graph)).items() if degree >= min_degree]
+        subgraph = graph.subgraph(degreeList)
+        return subgraph
+    if k_core:
+        kept = k_core_mask(graph, min_degree)
+    else:
+        kept = graph.degrees >= min_degree
+    view = MaskedGraph(graph)
+    view.remove_node_ids(np.flatnonzero(~kept))
+    return view
+
+
+def k_core_mask(graph, min_degree):
     """
-    degreeList = [node for node, degree in dict(nx.degree(graph)).items() if degree >= min_degree]
-    subgraph = graph.subgraph(degreeList)
-    return subgraph
+    Find the min_degree-core of a CSRGraph: the nodes left after repeatedly
+    removing every node with fewer than min_degree neighbors.
+
+    The nodes below the threshold form the queue (with a single threshold,
+    the bucket queue of the usual core decomposition needs only this one
+    bucket). All of them are peeled at once: their neighbors' degrees are
+    decremented, and the neighbors that drop below the threshold form the
+    next queue. Each node is peeled at most once, and each adjacency slot is
+    gathered only when its node is peeled, so the work is O(V + E).
+
+    Returns:
+      A boolean array over the node ids, True for the nodes in the core.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> g.degrees.tolist(), k_core_mask(g, 3).tolist()
+    ([2, 3, 2, 4, 2, 3, 2], [False, False, False, False, False, False, False])
+    """
+    degrees = graph.degrees.copy()
+    kept = np.zeros(len(graph.names), dtype=bool)
+    kept[graph.node_ids()] = True
+    queue = np.flatnonzero(kept & (degrees < min_degree))
+    while len(queue):
+        kept[queue] = False
+        neighbors = graph.expand(queue)[1]
+        neighbors = neighbors[kept[neighbors]]
+        touched, lost = np.unique(neighbors, return_counts=True)
+        degrees[touched] -= lost
+        queue = touched[degrees[touched] < min_degree]
+    return kept
 
 
 """"
@@ -303,6 +1058,13 @@ Compute the normalized cut for each discovered cluster.
 I've broken this down into the three next methods.
 """
 
+def _node_mask(graph, nodes):
+    """ A boolean array over the node ids of a CSRGraph, True for nodes. """
+    mask = np.zeros(len(graph.names), dtype=bool)
+    mask[[graph.index[node] for node in nodes]] = True
+    return mask
+
+
 def volume(nodes, graph):
     """
     Compute the volume for a list of nodes, which
@@ -310,16 +1072,15 @@ def volume(nodes, graph):
     nodes.
     Params:
       nodes...a list of strings for the nodes to compute the volume of.
-      graph...a networkx graph
+      graph...a networkx graph or CSRGraph
 
     >>> volume(['A', 'B', 'C'], example_graph())
     4
     """
-    graph_cpy = graph.copy()
-    sub_graph = graph.subgraph(nodes)
-    graph_cpy.remove_edges_from(sub_graph.edges())
-    count = len(graph_cpy.edges(nodes)) + sub_graph.number_of_edges()
-    return count
+    graph = as_csr(graph)
+    mask = _node_mask(graph, nodes)
+    edge_u, edge_v = graph.edge_arrays()
+    return int(np.count_nonzero(mask[edge_u] | mask[edge_v]))
 
 
 def cut(S, T, graph):
@@ -330,19 +1091,19 @@ def cut(S, T, graph):
     Params:
       S.......set of nodes in first subset
       T.......set of nodes in second subset
-      graph...networkx graph
+      graph...networkx graph or CSRGraph
     Returns:
       An int representing the cut-set.
 
     >>> cut(['A', 'B', 'C'], ['D', 'E', 'F', 'G'], example_graph())
     1
     """
-    graph_cpy = graph.copy()
-    graph_cpy.remove_edges_from(graph.subgraph(S).edges())
-    graph_cpy.remove_edges_from(graph.subgraph(T).edges())
-    count = graph_cpy.subgraph(S + T).number_of_edges()
-
-    return count
+    graph = as_csr(graph)
+    in_s = _node_mask(graph, S)
+    in_t = _node_mask(graph, T)
+    edge_u, edge_v = graph.edge_arrays()
+    crossing = (in_s[edge_u] & in_t[edge_v]) | (in_t[edge_u] & in_s[edge_v])
+    return int(np.count_nonzero(crossing))
 
 
 def norm_cut(S, T, graph):
@@ -351,11 +1112,12 @@ def norm_cut(S, T, graph):
     Params:
       S.......set of nodes in first subset
       T.......set of nodes in second subset
-      graph...networkx graph
+      graph...networkx graph or CSRGraph
     Returns:
       An float representing the normalized cut value
 
     """
+    graph = as_csr(graph)
     vol_s = volume(S, graph)
     vol_t = volume(T, graph)
     cut_set = cut(S, T, graph)
@@ -364,6 +1126,83 @@ def norm_cut(S, T, graph):
     return norm_cut_value
 
 
+def partition_labels(graph, clusters):
+    """
+    Turn a list of clusters (each a list of nodes, or a graph) that covers
+    every node of graph into an array of cluster labels indexed by node id.
+    The ids of nodes masked out of a MaskedGraph are labelled -1.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> partition_labels(g, [['A', 'B', 'C'], ['D', 'E', 'F', 'G']]).tolist()
+    [0, 0, 0, 1, 1, 1, 1]
+    >>> partition_labels(g, partition_girvan_newman(g, 5)).tolist()
+    [0, 0, 0, 1, 1, 1, 1]
+    >>> partition_labels(get_subgraph(g, 3), [['B'], ['D', 'F']]).tolist()
+    [-1, 0, -1, 1, -1, 1, -1]
+    """
+    labels = np.full(len(graph.names), -1, dtype=np.int64)
+    for label, cluster in enumerate(clusters):
+        labels[[graph.index[node] for node in cluster]] = label
+    missing = np.count_nonzero(labels[graph.node_ids()] < 0)
+    if missing:
+        raise ValueError('%d nodes are not in any cluster' % missing)
+    return labels
+
+
+def score_partition(graph, labels):
+    """
+    Score every cluster of a partition in one pass over the edge arrays.
+
+    Volume and cut follow the definitions above: a cluster's volume is the
+    number of edges with at least one end in it, and its cut is the number
+    of edges with exactly one end in it. Conductance and modularity use the
+    usual degree-based volumes instead.
+
+    Params:
+      graph....a networkx graph or CSRGraph
+      labels...an array with the cluster label (0, 1, ...) of each node id,
+               e.g., from partition_labels. Nodes labelled -1 (those
+               masked out of a MaskedGraph) are left out of every sum.
+    Returns:
+      A dict with per-cluster arrays 'volume', 'cut' and 'conductance', and
+      floats 'norm_cut' (the sum of cut / volume over the clusters, which is
+      norm_cut(S, T) for two clusters) and 'modularity'.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> scores = score_partition(g, partition_labels(g, [['A', 'B', 'C'], ['D', 'E', 'F', 'G']]))
+    >>> scores['volume'].tolist(), scores['cut'].tolist(), round(scores['norm_cut'], 4)
+    ([4, 6], [1, 1], 0.4167)
+    >>> scores['conductance'].tolist(), round(scores['modularity'], 4)
+    ([0.14285714285714285, 0.14285714285714285], 0.3642)
+    >>> view = get_subgraph(g, 3)
+    >>> scores = score_partition(view, partition_labels(view, [['B'], ['D', 'F']]))
+    >>> scores['volume'].tolist(), scores['cut'].tolist(), scores['norm_cut'], scores['modularity']
+    ([1, 2], [1, 1], 1.5, -0.125)
+    """
+    graph = as_csr(graph)
+    labels = np.asarray(labels)
+    k = int(labels.max()) + 1 if len(labels) else 0
+    edge_u, edge_v = graph.edge_arrays()
+    label_u = labels[edge_u]
+    label_v = labels[edge_v]
+    labelled = (label_u >= 0) & (label_v >= 0)
+    label_u, label_v = label_u[labelled], label_v[labelled]
+    same = label_u == label_v
+    internal = np.bincount(label_u[same], minlength=k)
+    boundary = np.bincount(label_u[~same], minlength=k) + np.bincount(label_v[~same], minlength=k)
+    volumes = internal + boundary
+    present = labels >= 0
+    degree_volumes = np.bincount(labels[present], weights=graph.degrees[present], minlength=k)
+    two_m = max(degree_volumes.sum(), 1)
+
+    norm_cuts = np.divide(boundary, volumes, out=np.zeros(k), where=volumes > 0)
+    smaller_side = np.minimum(degree_volumes, two_m - degree_volumes)
+    conductance = np.divide(boundary, smaller_side, out=np.zeros(k), where=smaller_side > 0)
+    modularity = np.sum(2 * internal / two_m - (degree_volumes / two_m) ** 2)
+    return {'volume': volumes, 'cut': boundary, 'norm_cut': float(norm_cuts.sum()),
+            'conductance': conductance, 'modularity': float(modularity)}
+
+
 def score_max_depths(graph, max_depths):
     """
     In order to assess the quality of the approximate partitioning method
@@ -381,8 +1220,39 @@ def score_max_depths(graph, max_depths):
       norm_cut value obtained by the partitions returned by
       partition_girvan_newman. See Log.txt for an example.
     """
-    prep = [(i, partition_girvan_newman(graph, i)) for i in max_depths]
-    output = [(i, norm_cut(comp[0].nodes(), comp[1].nodes(), graph)) for i, comp in prep if len(comp) >= 2]
+    csr_graph = as_csr(graph)
+    prep = [(i, partition_girvan_newman(csr_graph, i)) for i in max_depths]
+    output = [(i, norm_cut(comp[0].nodes(), comp[1].nodes(), csr_graph)) for i, comp in prep if len(comp) >= 2]
+    return output
+
+
+def score_sample_sizes(graph, max_depth, ks, seed=None):
+    """
+    Like score_max_depths, but sweep the number of sampled roots k used to
+    approximate betweenness, at a fixed max_depth. The edge with the highest
+    betweenness is reported too, so the smallest k that still picks the same
+    edge as the full computation is easy to spot.
+
+    Params:
+      graph.......a networkx Graph
+      max_depth...the max_depth passed to approximate_betweenness.
+      ks..........a list of ints for the number of sampled roots.
+      seed........seed for sampling the roots.
+
+    Returns:
+      A list of (int, float, tuple) tuples with k, the norm_cut value of the
+      resulting partition and the top-betweenness edge.
+
+    >>> [(k, round(score, 3), edge) for k, score, edge in score_sample_sizes(example_graph(), 5, [4, 7], seed=0)]
+    [(4, 0.417, ('B', 'D')), (7, 0.417, ('B', 'D'))]
+    """
+    output = []
+    csr_graph = as_csr(graph)
+    for k in ks:
+        betweenness = approximate_betweenness(csr_graph, max_depth, k=k, seed=seed)
+        comp = _remove_until_split(csr_graph, betweenness)
+        if len(comp) >= 2:
+            output.append((k, norm_cut(comp[0].nodes(), comp[1].nodes(), csr_graph), _ranked_edges(betweenness)[0][0]))
     return output
 
 
@@ -402,15 +1272,16 @@ def make_training_graph(graph, test_node, n):
     ('A', 'B') will be removed.
 
     Be sure to *copy* the input graph prior to removing edges.
+    (For a CSRGraph, the copy is a MaskedGraph view, so nothing is copied.)
 
     Params:
-      graph.......a networkx Graph
+      graph.......a networkx Graph or CSRGraph
       test_node...a string representing one node in the graph whose
                   edges will be removed.
       n...........the number of edges to remove.
 
     Returns:
-      A *new* networkx Graph with n edges removed.
+      A *new* networkx Graph (or MaskedGraph) with n edges removed.
 
     In this doctest, we remove edges for two friends of D:
     >>> g = example_graph()
@@ -419,6 +1290,9 @@ def make_training_graph(graph, test_node, n):
     >>> train_graph = make_training_graph(g, 'D', 2)
     >>> sorted(train_graph.neighbors('D'))
     ['F', 'G']
+    >>> csr_graph = CSRGraph.from_networkx(g)
+    >>> make_training_graph(csr_graph, 'D', 2).neighbors('D'), csr_graph.neighbors('D')
+    (['F', 'G'], ['B', 'E', 'F', 'G'])
     """
     graph_cpy = graph.copy()
     edges = [(test_node, node) for node in sorted(graph.neighbors(test_node))[0:n]]
@@ -432,8 +1306,13 @@ def jaccard(graph, node, k):
     the Jaccard similarity measure.
     Note that we don't return scores for edges that already appear in the graph.
 
+    The candidates are the nodes two hops away (see two_hop_candidates),
+    so on a CSRGraph the work depends on the neighborhood of node, not on
+    the size of the graph. A networkx graph is converted on every call, so
+    callers scoring many nodes should convert it once with as_csr.
+
     Params:
-      graph....a networkx graph
+      graph....a networkx graph or CSRGraph
       node.....a node in the graph (a string) to recommend links for.
       k........the number of links to recommend.
 
@@ -452,15 +1331,198 @@ def jaccard(graph, node, k):
     >>> jaccard(train_graph, 'D', 2)
     [(('D', 'E'), 0.5), (('D', 'A'), 0.0)]
     """
-    node_neighbours = set(graph.neighbors(node))
-    nodes = graph.nodes()
-    nodes.remove(node)
-    scores = [((node, possible_node), len(node_neighbours & set(graph.neighbors(possible_node))) /
-                       len(node_neighbours | set(graph.neighbors(possible_node))))
-              for possible_node in nodes if not graph.has_edge(node, possible_node)]
+    graph = as_csr(graph)
+    i = graph.index[node]
+    candidates, intersection = two_hop_candidates(graph, i)
+    scores = intersection / (graph.degrees[i] + graph.degrees[candidates] - intersection)
 
+    # Node ids follow alphabetical order, so sorting by id breaks ties by name.
+    order = np.lexsort((candidates, -scores))[0:k]
+    result = [((node, graph.names[j]), float(score)) for j, score in zip(candidates[order], scores[order])]
+    excluded = np.concatenate([[i], graph.neighbor_ids(i), candidates])
+    return result + [((node, graph.names[j]), 0.0) for j in zero_score_fill(graph, excluded, k - len(result))]
 
-    return sorted(scores, key=lambda x: (-x[1],x[0][1]), reverse=False)[0:k]
+
+def weighted_jaccard(graph, node, k):
+    """
+    Compute the k highest scoring edges to add to this node based on the
+    degree-weighted Jaccard of bonus.py: each shared neighbor z adds
+    1 / degree(z), and the sum is divided by
+    1 / (sum of node's neighbor degrees) + 1 / (sum of y's neighbor degrees).
+
+    Like jaccard, only the nodes two hops away are scored, and each one's
+    sum of neighbor degrees is gathered from its own neighbors, so the work
+    depends on the neighborhood of node. Nothing is computed for the whole
+    graph, and on a MaskedGraph the degrees of the masked graph are used.
+    The scores are those of batch_link_prediction(method='weighted_jaccard').
+
+    Params:
+      graph....a networkx graph or CSRGraph
+      node.....a node in the graph (a string) to recommend links for.
+      k........the number of links to recommend.
+
+    Returns:
+      A list of tuples in descending order of score, with ties broken
+      alphabetically, as jaccard.
+
+    >>> g = make_training_graph(example_graph(), 'D', 2)
+    >>> weighted_jaccard(g, 'D', 3)
+    [(('D', 'E'), 0.625), (('D', 'A'), 0.0), (('D', 'B'), 0.0)]
+    >>> weighted_jaccard(g, 'D', 3) == batch_link_prediction(g, ['D'], 3, method='weighted_jaccard')['D']
+    True
+    """
+    graph = as_csr(graph)
+    i = graph.index[node]
+    degrees = graph.degrees
+    neighbors = graph.neighbor_ids(i)
+    through, second = graph.expand(neighbors.astype(np.int64))[0:2]
+    candidates, position = np.unique(second, return_inverse=True)
+    numerator = np.bincount(position, weights=1.0 / degrees[through], minlength=len(candidates))
+    keep = (candidates != i) & ~np.isin(candidates, neighbors)
+    candidates, numerator = candidates[keep], numerator[keep]
+
+    rows, third = graph.expand(candidates.astype(np.int64))[0:2]
+    neighbor_degrees = np.bincount(np.searchsorted(candidates, rows), weights=degrees[third].astype(float),
+                                   minlength=len(candidates))
+    scores = numerator / (1.0 / degrees[neighbors].sum() + 1 / neighbor_degrees)
+
+    chosen, chosen_scores = _top_k(candidates, scores, k)
+    result = [((node, graph.names[j]), float(score)) for j, score in zip(chosen.tolist(), chosen_scores)]
+    excluded = np.concatenate([[i], neighbors, candidates])
+    return result + [((node, graph.names[j]), 0.0) for j in zero_score_fill(graph, excluded, k - len(result))]
+
+
+def two_hop_candidates(graph, i):
+    """
+    Find the nodes two hops from node id i (excluding i and its neighbors),
+    which are the only candidates with non-zero Jaccard scores, by walking
+    the neighbors of its neighbors. The work depends on the size of this
+    neighborhood, not on the size of the graph.
+
+    Params:
+      graph...a CSRGraph
+      i.......a node id
+    Returns:
+      Two arrays: the candidate node ids, in increasing order, and the
+      number of neighbors each shares with i.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> candidates, shared = two_hop_candidates(g, g.index['A'])
+    >>> [g.names[j] for j in candidates], shared.tolist()
+    (['D'], [1])
+    """
+    neighbors = graph.neighbor_ids(i)
+    second = graph.expand(neighbors.astype(np.int64))[1]
+    candidates, shared = np.unique(second, return_counts=True)
+    keep = (candidates != i) & ~np.isin(candidates, neighbors)
+    return candidates[keep], shared[keep]
+
+
+def zero_score_fill(graph, excluded, count):
+    """
+    Return the first count node ids, in alphabetical order, that are not in
+    excluded. These fill the top-k slots left after the scored candidates,
+    as every remaining node ties with a score of 0. The ids are visited
+    lazily, so at most count + len(excluded) of them are read.
+    """
+    if count <= 0:
+        return []
+    excluded = set(np.asarray(excluded).tolist())
+    fill = []
+    for j in graph.iter_node_ids():
+        if len(fill) == count:
+            break
+        if j not in excluded:
+            fill.append(j)
+    return fill
+
+
+def _top_k(candidates, scores, k):
+    """
+    Return the k highest scoring candidates (node ids) and their scores, with
+    ties broken by id (i.e., alphabetically). argpartition finds the k-th
+    best score, so only the scores at or above it need sorting.
+    """
+    if k <= 0:
+        return candidates[0:0], scores[0:0]
+    if len(scores) > k:
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        keep = scores >= threshold
+        candidates, scores = candidates[keep], scores[keep]
+    order = np.lexsort((candidates, -scores))[0:k]
+    return candidates[order], scores[order]
+
+
+def batch_link_prediction(graph, nodes, k, method='jaccard', block_size=256):
+    """
+    Compute the k highest scoring new edges for many nodes at once.
+
+    The overlap between every query node and every other node comes from one
+    sparse product per block of queries, A[queries] * W * A, where A is the
+    adjacency matrix and W weights each shared neighbor: 1 for Jaccard and
+    common neighbors, 1 / log(degree) for Adamic-Adar, and 1 / degree for the
+    degree-weighted Jaccard of bonus.py, whose denominator is
+    1 / (sum of x's neighbor degrees) + 1 / (sum of y's neighbor degrees).
+    The product stays sparse: each query's row only holds the nodes two hops
+    away, which are ranked, and the slots left over are filled with
+    zero-score nodes as in jaccard. So the work per query depends on its
+    two-hop neighborhood, not on the size of the graph.
+
+    Params:
+      graph........a networkx graph or CSRGraph
+      nodes........the nodes (strings) to recommend links for.
+      k............the number of links to recommend per node.
+      method.......'jaccard', 'common_neighbors', 'adamic_adar' or
+                   'weighted_jaccard'.
+      block_size...how many query rows to multiply at a time.
+
+    Returns:
+      A dict from each node to its list of ((node, other), score) tuples, in
+      descending order of score with ties broken alphabetically, as jaccard.
+
+    >>> g = make_training_graph(example_graph(), 'D', 2)
+    >>> batch_link_prediction(g, ['D'], 2)['D']
+    [(('D', 'E'), 0.5), (('D', 'A'), 0.0)]
+    >>> batch_link_prediction(g, ['A', 'D'], 1, method='common_neighbors')
+    {'A': [(('A', 'D'), 0.0)], 'D': [(('D', 'E'), 1.0)]}
+    """
+    graph = as_csr(graph)
+    adjacency = graph.adjacency()
+    degrees = graph.degrees.astype(float)
+    n = len(graph.names)
+    if method in ('jaccard', 'common_neighbors'):
+        weights = np.ones(n)
+    elif method == 'adamic_adar':
+        weights = np.divide(1, np.log(np.maximum(degrees, 1)), out=np.zeros(n), where=degrees > 1)
+    elif method == 'weighted_jaccard':
+        weights = np.divide(1, degrees, out=np.zeros(n), where=degrees > 0)
+        neighbor_degrees = adjacency.dot(degrees)
+        inverse_neighbor_degrees = np.divide(1, neighbor_degrees, out=np.full(n, np.inf),
+                                             where=neighbor_degrees > 0)
+    else:
+        raise ValueError('unknown link prediction method: %s' % method)
+    weighted = diags(weights).dot(adjacency).tocsr()
+
+    ids = np.array([graph.index[node] for node in nodes], dtype=np.int64)
+    result = {}
+    for start in range(0, len(ids), block_size):
+        block = ids[start:start + block_size]
+        overlap = adjacency[block].dot(weighted).tocsr()
+        for row, i in enumerate(block.tolist()):
+            candidates = overlap.indices[overlap.indptr[row]:overlap.indptr[row + 1]]
+            scores = overlap.data[overlap.indptr[row]:overlap.indptr[row + 1]]
+            if method == 'jaccard':
+                scores = scores / (degrees[i] + degrees[candidates] - scores)
+            elif method == 'weighted_jaccard':
+                scores = scores / (inverse_neighbor_degrees[i] + inverse_neighbor_degrees[candidates])
+            neighbors = graph.neighbor_ids(i)
+            keep = (scores > 0) & (candidates != i) & ~np.isin(candidates, neighbors)
+            chosen, chosen_scores = _top_k(candidates[keep], scores[keep], k)
+            node = graph.names[i]
+            result[node] = [((node, graph.names[j]), float(score)) for j, score in zip(chosen.tolist(), chosen_scores)]
+            excluded = np.concatenate([[i], neighbors, candidates[keep]])
+            result[node] += [((node, graph.names[j]), 0.0) for j in zero_score_fill(graph, excluded, k - len(chosen))]
+    return result
 
 
 # One limitation of Jaccard is that it only has non-zero values for nodes two hops away.
@@ -487,7 +1549,7 @@ def path_score(graph, root, k, beta):
     This algorithm should have the same time complexity as bfs above.
 
     Params:
-      graph....a networkx graph
+      graph....a networkx graph or CSRGraph
       root.....a node in the graph (a string) to recommend links for.
       k........the number of links to recommend.
       beta.....the beta parameter in the equation above.
@@ -507,11 +1569,149 @@ def path_score(graph, root, k, beta):
     >>> path_score(train_graph, 'D', k=4, beta=.5)
     [(('D', 'F'), 0.5), (('D', 'A'), 0.25), (('D', 'C'), 0.25)]
     """
-    node2distances, node2num_paths, node2parents = bfs(graph, root, k)
-    predicted_links = sorted([((root, node), pow(beta, node2distances[node]) * node2num_paths[node])
-                               for node in node2distances if not (graph.has_edge(root, node) or root == node)],
-                             key=lambda x: (-x[1], x[0][1]))[0:k]
-    return predicted_links
+    graph = as_csr(graph)
+    if k <= 0:
+        return []
+    # Paths to a node one level further are extended from paths to the level
+    # before, by one of the (degree - 1) edges not leading back to a parent.
+    growth = max(int(graph.degrees.max()) - 1, 0)
+    nodes, scores = [], []
+    kth_best = None
+    for depth, level, num_paths in path_count_levels(graph, root, k):
+        # Nodes at depth 1 are the root's neighbors, which already have an edge.
+        if depth >= 2:
+            nodes.append(level)
+            scores.append(pow(beta, depth) * num_paths)
+            found = np.concatenate(scores)
+            if len(found) >= k:
+                kth_best = -np.partition(-found, k - 1)[k - 1]
+        if kth_best is not None and depth < k:
+            # Bound the score of any node in the remaining levels; the bound
+            # is geometric in the depth, so its largest value is at one end.
+            next_paths = float(np.dot(num_paths, graph.degrees[level] - 1))
+            bound = max(pow(beta, depth + 1) * next_paths,
+                        pow(beta, k) * next_paths * pow(growth, k - depth - 1))
+            # Strictly below the k-th best, so no tie can change the order.
+            if bound * (1 + 1e-9) < kth_best:
+                break
+    if not nodes:
+        return []
+    nodes, scores = np.concatenate(nodes), np.concatenate(scores)
+    # Node ids follow alphabetical order, so sorting by id breaks ties by name.
+    order = np.lexsort((nodes, -scores))[0:k]
+    return [((root, graph.names[j]), float(score)) for j, score in zip(nodes[order], scores[order])]
+
+
+def path_count_levels(graph, root, max_depth):
+    """
+    Breadth-first search that only counts shortest paths. Unlike bfs it
+    keeps no parent lists and no dicts, and it runs lazily: each level is
+    expanded only when the previous one has been consumed, so a caller can
+    stop early.
+
+    Params:
+      graph.......a CSRGraph
+      root........the node to search from.
+      max_depth...the maximum depth to search.
+    Returns:
+      A generator of (depth, node ids, number of shortest paths) for each
+      level from depth 1 to max_depth, the last two as arrays.
+
+    >>> g = CSRGraph.from_networkx(example_graph())
+    >>> [(depth, [g.names[i] for i in ids], paths.tolist()) for depth, ids, paths in path_count_levels(g, 'E', 2)]
+    [(1, ['D', 'F'], [1, 1]), (2, ['B', 'G'], [1, 2])]
+    """
+    dist = np.full(len(graph.names), -1, dtype=np.int32)
+    num_paths = np.zeros(len(graph.names), dtype=np.int64)
+    frontier = np.array([graph.index[root]], dtype=np.int64)
+    dist[frontier] = 0
+    num_paths[frontier] = 1
+    for depth in range(1, max_depth + 1):
+        src, dst, _ = graph.expand(frontier)
+        dist[dst[dist[dst] == -1]] = depth
+        keep = dist[dst] == depth
+        src, dst = src[keep], dst[keep]
+        if len(dst) == 0:
+            return
+        np.add.at(num_paths, dst, num_paths[src])
+        frontier = np.unique(dst)
+        yield depth, frontier, num_paths[frontier]
+
+
+def batch_path_score(graph, roots, k, betas, max_depth=None, block_size=256):
+    """
+    Compute path_score for many roots and beta values at once.
+
+    Each root of a block is a column of a sparse matrix F holding the number
+    of shortest paths to the nodes of its current BFS frontier. A * F counts
+    the paths one step further for every root at once; entries for nodes
+    already visited (kept as a sparse mask with the same columns) are
+    dropped, and what is left is the next frontier. The path counts n_{x,y,i}
+    and depths i are kept, so any number of beta values can be scored from
+    one search.
+
+    Params:
+      graph.......a networkx graph or CSRGraph
+      roots.......the nodes (strings) to recommend links for.
+      k...........the number of links to recommend per root.
+      betas.......a list of beta values.
+      max_depth...how deep to search (path_score uses k).
+      block_size..how many roots to advance together.
+
+    Returns:
+      A dict from each beta to a dict from each root to the same list that
+      path_score(graph, root, k, beta) returns.
+
+    >>> g = example_graph()
+    >>> g.remove_edge(*('D', 'F'))
+    >>> batch_path_score(g, ['D', 'A'], k=4, betas=[.5])[.5]['D']
+    [(('D', 'F'), 0.5), (('D', 'A'), 0.25), (('D', 'C'), 0.25)]
+    """
+    graph = as_csr(graph)
+    if max_depth is None:
+        max_depth = k
+    adjacency = graph.adjacency()
+    n = len(graph.names)
+    ids = np.array([graph.index[root] for root in roots], dtype=np.int64)
+    result = {beta: {} for beta in betas}
+    for start in range(0, len(ids), block_size):
+        block = ids[start:start + block_size]
+        columns = np.arange(len(block))
+        frontier = csr_matrix((np.ones(len(block)), (block, columns)), shape=(n, len(block)))
+        visited = frontier.copy()
+        found = []
+        for depth in range(1, max_depth + 1):
+            reached = adjacency.dot(frontier)
+            frontier = (reached - reached.multiply(visited)).tocsr()
+            frontier.eliminate_zeros()
+            if frontier.nnz == 0:
+                break
+            visited = visited + (frontier != 0)
+            # Neighbors of the root (depth 1) already have an edge, so only depths >= 2 are candidates.
+            if depth >= 2:
+                found.append((frontier.tocoo(), depth))
+
+        if found:
+            nodes = np.concatenate([coo.row for coo, depth in found])
+            owners = np.concatenate([coo.col for coo, depth in found])
+            counts = np.concatenate([coo.data for coo, depth in found])
+            depths = np.concatenate([np.full(coo.nnz, depth) for coo, depth in found])
+        else:
+            nodes = owners = depths = np.array([], dtype=np.int64)
+            counts = np.array([])
+        for beta in betas:
+            # pow, not np.power, so the scores match path_score to the last bit.
+            scales = np.array([pow(beta, depth) for depth in range(max_depth + 1)])
+            scores = scales[depths] * counts
+            # Group by root, then rank by descending score and node id.
+            order = np.lexsort((nodes, -scores, owners))
+            bounds = np.searchsorted(owners[order], np.append(columns, len(block)))
+            for column, i in enumerate(block.tolist()):
+                top = order[bounds[column]:bounds[column + 1]][0:k]
+                root = graph.names[i]
+                result[beta][root] = [((root, graph.names[j]), float(score))
+                                      for j, score in zip(nodes[top], scores[top])]
+    return result
 
 
 def evaluate(predicted_edges, graph):
@@ -537,6 +1737,142 @@ def evaluate(predicted_edges, graph):
     return no_present_edges/len(predicted_edges)
 
 
+def _bonus_jaccard_wt():
+    """
+    Return jaccard_wt from bonus.py, in the bonus directory next to this
+    one, or None if it cannot be imported.
+    """
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'bonus')
+    if os.path.isdir(directory) and directory not in sys.path:
+        sys.path.append(directory)
+    try:
+        from bonus import jaccard_wt
+    except ImportError:
+        return None
+    return jaccard_wt
+
+
+def _link_scorers(betas):
+    """
+    The link prediction scorers compared by link_prediction_benchmark, by
+    name. Each is called as scorer(graph, node, k), and none of them does
+    any work for the whole graph, so timing a call times one query.
+    weighted_jaccard is the array version of bonus.py's score, and
+    jaccard_wt (if bonus.py can be imported) is bonus.py's own function,
+    which scores every node of the graph on each call.
+    """
+    scorers = {'jaccard': jaccard, 'weighted_jaccard': weighted_jaccard}
+    jaccard_wt = _bonus_jaccard_wt()
+    if jaccard_wt is not None:
+        scorers['jaccard_wt'] = jaccard_wt
+    for beta in betas:
+        scorers['path_score(beta=%g)' % beta] = lambda graph, node, k, beta=beta: path_score(graph, node, k, beta)
+    return scorers
+
+
+def _held_out_edges(graph, node, n):
+    """ The ids of the edges to the first n neighbors of node, sorted alphabetically (see make_training_graph). """
+    i = graph.index[node]
+    return [graph.edge_id(node, graph.names[j]) for j in np.sort(graph.neighbor_ids(i))[0:n]]
+
+
+def _run_benchmark(graph, name, test_nodes, n, k, betas):
+    """
+    Score every test node with one scorer, holding out n of its edges by
+    masking them in a single MaskedGraph view (restored after each node).
+
+    Returns:
+      The scorer name, the precision for each test node, the seconds spent
+      scoring and the peak bytes allocated while scoring the first node.
+    """
+    scorer = _link_scorers(betas)[name]
+    train_graph = MaskedGraph(graph)
+    precisions = []
+    seconds = 0.0
+    peak = 0
+    for position, node in enumerate(test_nodes):
+        held_out = _held_out_edges(graph, node, n)
+        train_graph.remove_edge_ids(held_out)
+        # Tracing allocations slows scoring down, so memory is measured on a separate run of the first node.
+        if position == 0:
+            tracemalloc.start()
+            scorer(train_graph, node, k)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        start = time.perf_counter()
+        predicted = scorer(train_graph, node, k)
+        seconds += time.perf_counter() - start
+        train_graph.restore_edge_ids(held_out)
+        precisions.append(evaluate([edge for edge, score in predicted], graph) if predicted else 0.0)
+    return name, precisions, seconds, peak
+
+
+def _benchmark_task(args):
+    return _run_benchmark(_worker_graph, *args)
+
+
+def link_prediction_benchmark(graph, n_test, n=5, k=5, betas=(.1, .5, .9), seed=None, workers=None):
+    """
+    Compare the link prediction scorers (jaccard, path_score for each beta,
+    and the degree-weighted Jaccard of bonus.py, both as weighted_jaccard
+    and as bonus.jaccard_wt itself) over many test nodes.
+
+    As in main, each test node has the edges to its first n neighbors held
+    out, and a scorer's precision is the fraction of its top k edges that
+    are in the original graph. The edges are masked in a MaskedGraph view
+    rather than removed from a copy of the graph.
+
+    Params:
+      graph.....a networkx graph or CSRGraph
+      n_test....the number of test nodes, sampled among nodes with more
+                than n neighbors.
+      n.........the number of edges to hold out per test node.
+      k.........the number of links to recommend.
+      betas.....the beta values to run path_score with.
+      seed......seed for sampling the test nodes.
+      workers...if more than 1, the number of processes to spread the
+                (scorer, test nodes) tasks across.
+
+    Returns:
+      A dict from each scorer name to a dict with its mean 'precision', its
+      total scoring time in 'seconds', 'seconds_per_query' and the
+      'peak_bytes' allocated by a single query.
+
+    >>> results = link_prediction_benchmark(example_graph(), 2, n=1, k=2, betas=[.5], seed=0)
+    >>> sorted(results)
+    ['jaccard', 'jaccard_wt', 'path_score(beta=0.5)', 'weighted_jaccard']
+    >>> results['jaccard_wt']['precision'] == results['weighted_jaccard']['precision']
+    True
+    >>> sorted(results['jaccard'])
+    ['peak_bytes', 'precision', 'seconds', 'seconds_per_query']
+    """
+    graph = as_csr(graph)
+    rng = np.random.RandomState(seed)
+    eligible = np.flatnonzero(graph.degrees > n)
+    test_nodes = [graph.names[i] for i in np.sort(rng.choice(eligible, min(n_test, len(eligible)), replace=False))]
+
+    names = list(_link_scorers(betas))
+    chunks = max(1, workers or 1)
+    tasks = [(name, list(chunk), n, k, betas) for name in names
+             for chunk in np.array_split(test_nodes, chunks) if len(chunk)]
+    if workers is not None and workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(graph,)) as pool:
+            outputs = pool.map(_benchmark_task, tasks)
+    else:
+        outputs = [_run_benchmark(graph, *task) for task in tasks]
+
+    results = {name: {'precision': [], 'seconds': 0.0, 'peak_bytes': 0} for name in names}
+    for name, precisions, seconds, peak in outputs:
+        results[name]['precision'].extend(precisions)
+        results[name]['seconds'] += seconds
+        results[name]['peak_bytes'] = max(results[name]['peak_bytes'], peak)
+    for result in results.values():
+        queries = len(result['precision'])
+        result['precision'] = float(np.mean(result['precision'])) if queries else 0.0
+        result['seconds_per_query'] = result['seconds'] / queries if queries else 0.0
+    return results
+
+
 """
 Next, we'll download a real dataset to see how our algorithm performs.
 """
@@ -549,19 +1885,261 @@ def download_data():
 
 def read_graph():
     """ Read 'edges.txt.gz' into a networkx **undirected** graph.
-    Done for you.
+    Done for you. (main reads it with read_csr_graph instead, which parses
+    the file once and memory-maps the cached arrays on later runs.)
     Returns:
       A networkx undirected graph.
     """
     return nx.read_edgelist('edges.txt.gz', delimiter='\t')
 
 
+def parse_edgelist(path, delimiter='\t'):
+    """
+    Parse a (possibly gzipped) edge list, one "u<delimiter>v" pair per line
+    with '#' comments, as nx.read_edgelist does, straight into a CSRGraph.
+    np.unique over all the names gives both the sorted name table and the
+    integer endpoints in one step.
+    """
+    pairs = list(edgelist_pairs(path, delimiter))
+    names, ids = np.unique(np.array(pairs, dtype=str).reshape(-1), return_inverse=True)
+    ids = ids.reshape(-1, 2)
+    return CSRGraph.from_edges(names.tolist(), ids[:, 0], ids[:, 1])
+
+
+def edgelist_pairs(path, delimiter='\t'):
+    """ Stream the (u, v) name pairs of a (possibly gzipped) edge list, skipping '#' comments. """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            pair = line.split('#')[0].strip().split(delimiter)[0:2]
+            if len(pair) == 2:
+                yield pair[0], pair[1]
+
+
+def follower_pairs(path):
+    """
+    Stream the (user, follower) pairs of a pickle of follower lists, like
+    the followers_followers_dict of assignment 4: a dict from each user id
+    to the list of its followers. The file may hold several such dicts
+    pickled one after another (e.g., appended by a crawler as it goes);
+    they are loaded one at a time. Ids are turned into strings, as they
+    would be read from an edge list. Users without followers are left out.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                followers = pickle.load(f)
+            except EOFError:
+                return
+            for user, users in followers.items():
+                for follower in users:
+                    yield str(user), str(follower)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _merge_runs(paths, block_size):
+    """
+    Merge sorted arrays of unique keys, saved as .npy files, reading at most
+    block_size keys of each at a time. Yields the union, without duplicates,
+    as a sequence of sorted blocks.
+    """
+    runs = [np.load(path, mmap_mode='r') for path in paths]
+    positions = [0] * len(runs)
+    while True:
+        blocks = [run[position:position + block_size] for run, position in zip(runs, positions)]
+        if not any(len(block) for block in blocks):
+            return
+        # Every key up to the smallest last key read is in the blocks, so those can be merged now.
+        bound = min(block[-1] for block in blocks if len(block))
+        taken = []
+        for r, block in enumerate(blocks):
+            count = int(np.searchsorted(block, bound, side='right'))
+            taken.append(block[0:count])
+            positions[r] += count
+        yield np.unique(np.concatenate(taken))
+
+
+def write_csr_graph(pairs, directory, batch_size=1 << 20):
+    """
+    Build a CSRGraph from a stream of (u, v) name pairs that may not fit in
+    memory, and save it in directory, as CSRGraph.save does.
+
+    The pairs are read batch_size at a time and each batch is written to a
+    temporary run file as integer ids. Once all the names are known and
+    sorted, each run is relabelled to alphabetical ids, symmetrised, sorted
+    and deduplicated, and the runs are merged block by block into the
+    adjacency array (an external merge sort). The edge arrays are then
+    filled in one more sequential pass over it. Only the name table, a few
+    arrays with one entry per node and one batch (or one block per run) are
+    in memory at a time.
+
+    Params:
+      pairs........an iterable of (u, v) node name pairs, e.g. edgelist_pairs(path)
+                   or follower_pairs(path).
+      directory....where to save the graph.
+      batch_size...the number of pairs (and keys per run) held in memory at once.
+    Returns:
+      The graph, memory-mapped from directory by CSRGraph.load.
+
+    >>> directory = tempfile.mkdtemp()
+    >>> pairs = [('B', 'A'), ('A', 'C'), ('B', 'C'), ('A', 'B'), ('B', 'D')]
+    >>> g = write_csr_graph(pairs, directory, batch_size=2)
+    >>> g.nodes(), g.edges()
+    (['A', 'B', 'C', 'D'], [('A', 'B'), ('A', 'C'), ('B', 'C'), ('B', 'D')])
+    >>> g.edge_ids.tolist() == CSRGraph.from_networkx(nx.Graph(pairs)).edge_ids.tolist()
+    True
+    """
+    os.makedirs(directory, exist_ok=True)
+    runs = tempfile.mkdtemp(dir=directory)
+    try:
+        index = {}
+        paths = []
+        for batch in _batches(pairs, batch_size):
+            ids = np.fromiter((index.setdefault(name, len(index)) for pair in batch for name in pair[0:2]),
+                              dtype=np.int64, count=2 * len(batch))
+            paths.append(os.path.join(runs, '%d.npy' % len(paths)))
+            np.save(paths[-1], ids.reshape(-1, 2))
+        names = sorted(index)
+        rank = np.empty(len(names), dtype=np.int64)
+        rank[[index[name] for name in names]] = np.arange(len(names))
+        del index
+        n = len(names)
+
+        # Each adjacency slot (row, column) is the key row << 32 | column, so sorting keys sorts the CSR.
+        for path in paths:
+            ids = rank[np.load(path)]
+            np.save(path, np.unique(np.concatenate([ids[:, 0] << 32 | ids[:, 1], ids[:, 1] << 32 | ids[:, 0]])))
+        degrees = np.zeros(n, dtype=np.int64)
+        slots = edges = 0
+        raw_indices = os.path.join(runs, 'indices.raw')
+        with open(raw_indices, 'wb') as f:
+            for keys in _merge_runs(paths, batch_size):
+                rows, columns = keys >> 32, keys & 0xffffffff
+                f.write(columns.astype(np.int32).tobytes())
+                present, counts = np.unique(rows, return_counts=True)
+                degrees[present] += counts
+                slots += len(keys)
+                edges += int(np.count_nonzero(rows <= columns))
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        np.save(os.path.join(directory, 'names.npy'), np.array(names, dtype=str))
+        np.save(os.path.join(directory, 'indptr.npy'), indptr)
+        del names
+
+        def array(name, length):
+            return np.lib.format.open_memmap(os.path.join(directory, name + '.npy'), mode='w+',
+                                             dtype=np.int32, shape=(length,))
+        indices, edge_u, edge_v, edge_ids = (array('indices', slots), array('edge_u', edges),
+                                             array('edge_v', edges), array('edge_ids', slots))
+        if slots:
+            indices[:] = np.memmap(raw_indices, dtype=np.int32, mode='r')
+        # Edge ids follow the canonical slots (row <= column) in order, as in CSRGraph. The mirror slot of edge
+        # (u, v), u < v, is in row v: as edges come in order of u, it is the next slot of row v not yet filled.
+        mirrored = np.zeros(n, dtype=np.int64)
+        edge = 0
+        for start in range(0, slots, batch_size):
+            columns = indices[start:start + batch_size].astype(np.int64)
+            positions = np.arange(start, start + len(columns))
+            rows = np.searchsorted(indptr, positions, side='right') - 1
+            canonical = rows <= columns
+            u, v, positions = rows[canonical], columns[canonical], positions[canonical]
+            ids = np.arange(edge, edge + len(u))
+            edge += len(u)
+            edge_u[ids], edge_v[ids], edge_ids[positions] = u, v, ids
+            upper = u < v
+            order = np.argsort(v[upper], kind='stable')
+            v, ids = v[upper][order], ids[upper][order]
+            ranks = np.arange(len(v)) - np.searchsorted(v, v)
+            edge_ids[indptr[v] + mirrored[v] + ranks] = ids
+            present, counts = np.unique(v, return_counts=True)
+            mirrored[present] += counts
+        for mapped in (indices, edge_u, edge_v, edge_ids):
+            mapped.flush()
+        del indices, edge_u, edge_v, edge_ids
+    finally:
+        shutil.rmtree(runs)
+    return CSRGraph.load(directory)
+
+
+def _file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csr_graph(path='edges.txt.gz', cache_dir=None, batch_size=None):
+    """
+    Read an edge list (by default 'edges.txt.gz') into a CSRGraph, parsing
+    the text only once. The parsed graph is saved in cache_dir (by default
+    path + '.cache') and memory-mapped by later calls.
+
+    The cache is rebuilt when the source changes: if its modification time
+    or size differ from those recorded, its SHA-1 is compared too, so a file
+    that was only touched or copied is not parsed again.
+
+    With batch_size, the cache is built by write_csr_graph, reading the file
+    in batches of that many edges, for edge lists larger than memory.
+
+    Returns:
+      A CSRGraph with the same nodes and edges as read_graph().
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'edges.txt.gz')
+    >>> with gzip.open(path, 'wt') as f:
+    ...     _ = f.write('A\\tB\\nB\\tC\\nA\\tC\\n')
+    >>> graph = read_csr_graph(path)
+    >>> sorted(os.listdir(path + '.cache'))[-3:]
+    ['indptr.npy', 'meta.json', 'names.npy']
+    >>> read_csr_graph(path).edges()
+    [('A', 'B'), ('A', 'C'), ('B', 'C')]
+    """
+    if cache_dir is None:
+        cache_dir = path + '.cache'
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    stat = os.stat(path)
+    source = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    if meta is not None and all(meta.get(key) == value for key, value in source.items()):
+        return CSRGraph.load(cache_dir)
+
+    digest = _file_digest(path)
+    if meta is None or meta.get('sha1') != digest:
+        # Remove the old metadata first, so an interrupted rebuild is never mistaken for a valid cache.
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        if batch_size is None:
+            parse_edgelist(path).save(cache_dir)
+        else:
+            write_csr_graph(edgelist_pairs(path), cache_dir, batch_size)
+    source['sha1'] = digest
+    with open(meta_path, 'w') as f:
+        json.dump(source, f)
+    return CSRGraph.load(cache_dir)
+
+
 def main():
     """
     FYI: This takes ~10-15 seconds to run on my laptop.
     """
     download_data()
-    graph = read_graph()
+    graph = read_csr_graph()
     print('graph has %d nodes and %d edges' %
           (graph.order(), graph.number_of_edges()))
     subgraph = get_subgraph(graph, 2)
@@ -0,0 +1,252 @@
+"""
+Benchmarks for the graph algorithms in a1.py.
+
+Seeded synthetic graphs (Erdos-Renyi, Barabasi-Albert and planted partition)
+are generated straight into CSRGraphs at sizes from 1e3 to 1e6 edges, and
+bfs, approximate_betweenness, partition_girvan_newman, jaccard, path_score
+and norm_cut are timed on each. The results are written to a JSON file
+(benchmark.json by default), together with the git commit they were run at,
+so runs can be compared across commits.
+
+A function that takes more than max_seconds on one size is not run on the
+larger graphs of the same generator: it has reached its scaling limit, which
+the results record as skipped.
+"""
+import json
+import platform
+import random
+import subprocess
+import time
+
+import numpy as np
+
+import a1
+
+
+def _names(n):
+    """ Zero-padded node names, so alphabetical order is numeric order. """
+    width = len(str(max(n - 1, 0)))
+    return ['n%0*d' % (width, i) for i in range(n)]
+
+
+def _sample_edges(rng, n_edges, draw):
+    """
+    Call draw(rng, count) for candidate (src, dst) arrays until n_edges
+    distinct undirected edges without self-loops are found, and keep the
+    first n_edges of them in the order they were drawn.
+    """
+    src = np.array([], dtype=np.int64)
+    dst = np.array([], dtype=np.int64)
+    while len(src) < n_edges:
+        more_src, more_dst = draw(rng, int((n_edges - len(src)) * 1.1) + 10)
+        src = np.concatenate([src, more_src])
+        dst = np.concatenate([dst, more_dst])
+        keep = src != dst
+        src, dst = src[keep], dst[keep]
+        keys = np.minimum(src, dst) * (1 << 32) + np.maximum(src, dst)
+        first = np.sort(np.unique(keys, return_index=True)[1])
+        src, dst = src[first], dst[first]
+    return src[0:n_edges], dst[0:n_edges]
+
+
+def erdos_renyi(n_edges, degree=10, seed=None):
+    """
+    A G(n, m) random graph: n_edges edges drawn uniformly among
+    n = 2 * n_edges / degree nodes.
+
+    Params:
+      n_edges....the number of edges.
+      degree.....the average degree, which sets the number of nodes.
+      seed.......random seed.
+    Returns:
+      A CSRGraph.
+
+    >>> g = erdos_renyi(100, seed=0)
+    >>> g.order(), g.number_of_edges()
+    (20, 100)
+    """
+    n = max(2, 2 * n_edges // degree)
+    rng = np.random.RandomState(seed)
+    src, dst = _sample_edges(rng, n_edges, lambda rng, count: (rng.randint(0, n, count), rng.randint(0, n, count)))
+    return a1.CSRGraph.from_edges(_names(n), src, dst)
+
+
+def barabasi_albert(n_edges, m=5, seed=None):
+    """
+    A Barabasi-Albert preferential attachment graph with about n_edges edges:
+    each new node links to m existing nodes, picked with probability
+    proportional to their degree (by picking a random endpoint of the edges
+    so far). Repeated picks are dropped, so a few nodes get fewer than m.
+
+    Params:
+      n_edges....the number of edges to aim for.
+      m..........the number of edges added with each node.
+      seed.......random seed.
+    Returns:
+      A CSRGraph.
+
+    >>> g = barabasi_albert(100, seed=0)
+    >>> g.order(), g.number_of_edges() <= 100
+    (25, True)
+    """
+    n = max(m + 1, n_edges // m + m)
+    rng = random.Random(seed)
+    # The first new node links to all m initial nodes.
+    endpoints = []
+    for target in range(m):
+        endpoints += [m, target]
+    for node in range(m + 1, n):
+        for _ in range(m):
+            endpoints += [node, endpoints[int(rng.random() * len(endpoints))]]
+    edges = np.array(endpoints, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    return a1.CSRGraph.from_edges(_names(n), edges[:, 0], edges[:, 1])
+
+
+def planted_partition(n_edges, groups=4, p_within=.8, degree=10, seed=None):
+    """
+    A planted partition graph: the nodes are split into groups of
+    consecutive ids, and a fraction p_within of the edges join two nodes of
+    the same group, the rest two nodes picked anywhere.
+
+    Params:
+      n_edges....the number of edges.
+      groups.....the number of groups.
+      p_within...the fraction of edges inside a group.
+      degree.....the average degree, which sets the number of nodes.
+      seed.......random seed.
+    Returns:
+      A CSRGraph.
+
+    >>> g = planted_partition(200, groups=2, p_within=1, seed=0)
+    >>> g.order(), g.number_of_edges(), len(g.component_node_lists())
+    (40, 200, 2)
+    """
+    n = max(2 * groups, 2 * n_edges // degree)
+    size = n // groups
+
+    def draw(rng, count):
+        within = rng.random_sample(count) < p_within
+        group = rng.randint(0, groups, count)
+        src = np.where(within, group * size + rng.randint(0, size, count), rng.randint(0, n, count))
+        dst = np.where(within, group * size + rng.randint(0, size, count), rng.randint(0, n, count))
+        return src, dst
+
+    src, dst = _sample_edges(np.random.RandomState(seed), n_edges, draw)
+    return a1.CSRGraph.from_edges(_names(n), src, dst)
+
+
+GENERATORS = {
+    'erdos_renyi': erdos_renyi,
+    'barabasi_albert': barabasi_albert,
+    'planted_partition': planted_partition,
+}
+
+
+def _tasks(graph, queries, seed):
+    """
+    The benchmarked calls on graph, as (name, function, calls) triples,
+    where function runs all the calls. bfs, jaccard and path_score are
+    called from the same queries nodes, picked at random among the nodes
+    with at least one edge. norm_cut splits the node ids in half, which for
+    planted_partition graphs follows the group boundaries.
+    """
+    rng = np.random.RandomState(seed)
+    candidates = np.flatnonzero(graph.degrees > 0)
+    nodes = [graph.names[i] for i in rng.choice(candidates, min(queries, len(candidates)), replace=False)]
+    half = graph.order() // 2
+    S, T = graph.names[0:half], graph.names[half:]
+    return [
+        ('bfs', lambda: [a1.bfs(graph, node, 3) for node in nodes], len(nodes)),
+        ('approximate_betweenness', lambda: a1.approximate_betweenness(graph, 2), 1),
+        ('partition_girvan_newman', lambda: a1.partition_girvan_newman(graph, 2), 1),
+        ('jaccard', lambda: [a1.jaccard(graph, node, 5) for node in nodes], len(nodes)),
+        ('path_score', lambda: [a1.path_score(graph, node, 5, .5) for node in nodes], len(nodes)),
+        ('norm_cut', lambda: a1.norm_cut(S, T, graph), 1),
+    ]
+
+
+def _commit():
+    """ The current git commit, or None outside a git checkout. """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=(1000, 10000, 100000, 1000000), generators=None, queries=5, max_seconds=60, seed=0,
+                   output='benchmark.json'):
+    """
+    Time the a1 functions on each generator at each size.
+
+    Params:
+      sizes.........the numbers of edges of the generated graphs.
+      generators....names of the GENERATORS to use (all by default).
+      queries.......the number of nodes to run bfs, jaccard and path_score from.
+      max_seconds...functions taking longer than this are skipped at the larger
+                    sizes of the same generator.
+      seed..........random seed, for the graphs and the query nodes.
+      output........the JSON file to write, or None.
+    Returns:
+      A dict with the commit, the settings, the seconds taken to generate
+      each graph and a list of results, one per generator, size and
+      function, with the graph's nodes and edges, the seconds taken, the
+      number of calls and the seconds per call (None for skipped functions).
+
+    >>> report = run_benchmarks(sizes=[100], generators=['erdos_renyi'], output=None)
+    >>> [result['function'] for result in report['results']]
+    ['bfs', 'approximate_betweenness', 'partition_girvan_newman', 'jaccard', 'path_score', 'norm_cut']
+    >>> sorted(report['results'][0])
+    ['calls', 'edges', 'function', 'generator', 'nodes', 'seconds', 'seconds_per_call', 'size']
+    """
+    if generators is None:
+        generators = sorted(GENERATORS)
+    results = []
+    generated = []
+    for name in generators:
+        too_slow = set()
+        for size in sorted(sizes):
+            start = time.perf_counter()
+            graph = GENERATORS[name](size, seed=seed + size)
+            generated.append({'generator': name, 'size': size, 'seconds': time.perf_counter() - start})
+            for function, run, calls in _tasks(graph, queries, seed + size):
+                result = {'generator': name, 'size': size, 'nodes': graph.order(),
+                          'edges': graph.number_of_edges(), 'function': function, 'calls': calls}
+                if function in too_slow:
+                    result['seconds'] = result['seconds_per_call'] = None
+                else:
+                    start = time.perf_counter()
+                    run()
+                    result['seconds'] = time.perf_counter() - start
+                    result['seconds_per_call'] = result['seconds'] / max(calls, 1)
+                    if result['seconds'] > max_seconds:
+                        too_slow.add(function)
+                results.append(result)
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': seed,
+        'queries': queries,
+        'max_seconds': max_seconds,
+        'generated': generated,
+        'results': results,
+    }
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    report = run_benchmarks()
+    print('%-18s %8s %8s %-24s %12s' % ('generator', 'nodes', 'edges', 'function', 'sec/call'))
+    for result in report['results']:
+        seconds = result['seconds_per_call']
+        print('%-18s %8d %8d %-24s %12s' % (result['generator'], result['nodes'], result['edges'], result['function'],
+                                            'skipped' if seconds is None else '%.4f' % seconds))
+    print('results written to benchmark.json')
+
+
+if __name__ == '__main__':
+    main()
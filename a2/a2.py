@@ -22,19 +22,24 @@ help.
 """
 
 # No imports allowed besides these.
+from array import array
 from collections import Counter, defaultdict
 from itertools import chain, combinations
 import glob
 import matplotlib.pyplot as plt
+import multiprocessing
 import numpy as np
 import os
 import re
+import shutil
 from scipy.sparse import csr_matrix
 from sklearn.cross_validation import KFold
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 import string
 import tarfile
+import tempfile
 import urllib.request
+import zlib
 
 
 def download_data():
@@ -70,6 +75,43 @@ def read_data(path):
     return np.array([d[1] for d in data]), np.array([d[0] for d in data])
 
 
+def review_files(path, held_out=10, seed=0):
+    """
+    List the review files under path (in its 'pos' and 'neg' subdirectories,
+    as read_data does) without reading them, for streaming.
+
+    Params:
+      path.......path to files
+      held_out...every held_out-th file (in sorted order) is held out
+                 for testing.
+      seed.......random seed for the order of the training files, so
+                 each mini-batch mixes both labels.
+    Returns:
+      train......list of (label, filename) tuples, shuffled.
+      test.......list of (label, filename) tuples, the held-out files.
+    """
+    files = [(1, f) for f in sorted(glob.glob(os.path.join(path, 'pos', '*.txt')))]
+    files += [(0, f) for f in sorted(glob.glob(os.path.join(path, 'neg', '*.txt')))]
+    files.sort(key=lambda x: x[1])
+    train = [f for i, f in enumerate(files) if i % held_out != 0]
+    test = [f for i, f in enumerate(files) if i % held_out == 0]
+    order = np.random.RandomState(seed).permutation(len(train))
+    return [train[i] for i in order], test
+
+
+def document_batches(files, batch_size):
+    """
+    Read a list of (label, filename) tuples in mini-batches.
+
+    Returns:
+      A generator of (docs, labels) arrays, batch_size documents at a time.
+    """
+    for start in range(0, len(files), batch_size):
+        batch = files[start:start + batch_size]
+        docs = [open(f).readlines()[0] for label, f in batch]
+        yield np.array(docs), np.array([label for label, f in batch])
+
+
 def tokenize(doc, keep_internal_punct=False):
     """
     Tokenize a string.
@@ -221,7 +263,165 @@ def featurize(tokens, feature_fns):
 
     return sorted(feats.items(), key=lambda x: x[0])
 
-def vectorize(tokens_list, feature_fns, min_freq, vocab=None):
+class HashedVocab:
+    """
+    The feature space of vectorize's hashed mode (the "hashing trick").
+    Feature names are hashed into a fixed number of columns, 2**bits, so
+    memory does not grow with the number of distinct features, and
+    training and testing data are vectorized independently. A second hash
+    bit gives each name a sign, so features that collide in a column tend
+    to cancel out rather than add up.
+
+    columns is the mask of the columns kept by min_freq on the training
+    data, seen the mask of the columns any feature hashed to, and signs the
+    sign of the first feature name seen in each column. No names are kept
+    while fitting: top_columns ranks the columns from the signed
+    coefficients alone, and resolve_names then finds the names of only the
+    columns top_coefs reports, in a second pass over the training
+    documents, and keeps them in reverse_map. With collisions=True, every
+    name seen in each column is also kept, for collision_report.
+
+    >>> vocab = HashedVocab(4, collisions=True)
+    >>> vocab.hash('token=movie'), vocab.hash('token=horrible')
+    ((15, 1), (4, -1))
+    >>> tokens_list = [tokenize(d) for d in ["Isn't this movie great?", "Horrible, horrible movie"]]
+    >>> X, vocab = vectorize(tokens_list, [token_features], 1, vocab=vocab)
+    >>> vocab.collision_report()['top_collisions']
+    [(15, ['token=great', 'token=movie'])]
+    >>> vocab.resolve_names(tokens_list, [token_features], [4])
+    >>> vocab.items()
+    [('token=horrible', 4)]
+    """
+
+    def __init__(self, bits, collisions=False):
+        self.bits = bits
+        self.n_features = 2 ** bits
+        self.fitted = False
+        self.columns = np.ones(self.n_features, dtype=bool)
+        self.seen = np.zeros(self.n_features, dtype=bool)
+        self.signs = np.ones(self.n_features, dtype=np.int8)
+        self.reverse_map = {}
+        self.collisions = defaultdict(set) if collisions else None
+
+    def hash(self, name):
+        """ The column and sign of a feature name, the same in every process. """
+        h = zlib.crc32(name.encode('utf-8'))
+        return h & (self.n_features - 1), 1 if h & 0x80000000 else -1
+
+    def record(self, name, column, sign):
+        if not self.seen[column]:
+            self.seen[column] = True
+            self.signs[column] = sign
+        if self.collisions is not None:
+            self.collisions[column].add(name)
+
+    def items(self):
+        """ (feature name, column) pairs for the columns in reverse_map, like a vocab dict. """
+        return [(name, column) for column, name in self.reverse_map.items()]
+
+    def top_columns(self, coef, label, n):
+        """
+        The n kept columns with the highest (label 1) or lowest (label 0)
+        coefficient, once each is multiplied by the sign of its column.
+        """
+        columns = np.flatnonzero(self.seen & self.columns)
+        order = np.argsort(coef[columns] * self.signs[columns])
+        if label == 1:
+            order = order[::-1]
+        return columns[order][:n]
+
+    def resolve_names(self, tokens_lists, feature_fns, columns):
+        """
+        Featurize the training documents again, in the same order, and keep
+        in reverse_map the first feature name hashed to each of columns (the
+        one whose sign is in signs). Stops once every column has a name.
+
+        Params:
+          tokens_lists...an iterable of token lists, e.g., a generator over
+                         batches of documents.
+          feature_fns....the feature functions used to fit.
+          columns........the columns to name, e.g., from top_columns.
+        """
+        wanted = set(int(column) for column in columns) - set(self.reverse_map)
+        for tokens in tokens_lists:
+            if not wanted:
+                break
+            feats = defaultdict(lambda: 0)
+            for feature_fn in feature_fns:
+                feature_fn(tokens, feats)
+            for name in feats:
+                column = self.hash(name)[0]
+                if column in wanted:
+                    self.reverse_map[column] = name
+                    wanted.discard(column)
+
+    def collision_report(self):
+        """
+        Returns:
+          A dict with the number of distinct feature names seen, the number of
+          columns they use, the number of names that share a column with
+          another, and the ten columns with the most names (as (column,
+          sorted names) pairs). Needs collisions=True.
+        """
+        crowded = sorted(self.collisions.items(), key=lambda x: (-len(x[1]), x[0]))
+        return {'features': sum(len(names) for names in self.collisions.values()),
+                'columns': len(self.collisions),
+                'colliding_features': sum(len(names) for names in self.collisions.values() if len(names) > 1),
+                'top_collisions': [(column, sorted(names)) for column, names in crowded[0:10] if len(names) > 1]}
+
+
+def hashed_vectorize(tokens_list, feature_fns, min_freq, vocab, fit=None):
+    """
+    Vectorize with a HashedVocab: each feature's count is added, with its
+    sign, to the column its name hashes to. Unlike the dict vocab, which
+    only holds token features, every feature function's features are kept.
+
+    If vocab has not been fit yet, or if fit is True, the documents are
+    training data: the columns seen and their signs are recorded, and
+    columns whose total (unsigned) count is below min_freq are dropped from
+    vocab.columns. Otherwise only the columns in vocab.columns are filled.
+
+    Returns:
+      - a csr_matrix with vocab.n_features columns.
+      - vocab
+    """
+    if fit is None:
+        fit = not vocab.fitted
+    data = []
+    counts = []
+    indices = []
+    indptr = [0]
+    for tokens in tokens_list:
+        feats = defaultdict(lambda: 0)
+        for feature_fn in feature_fns:
+            feature_fn(tokens, feats)
+        row = defaultdict(lambda: 0)
+        row_counts = defaultdict(lambda: 0)
+        for name, value in feats.items():
+            column, sign = vocab.hash(name)
+            if fit:
+                vocab.record(name, column, sign)
+            row[column] += sign * value
+            row_counts[column] += value
+        for column, value in row.items():
+            indices.append(column)
+            data.append(value)
+            counts.append(row_counts[column])
+        indptr.append(len(indices))
+
+    indices = np.array(indices, dtype=np.int64)
+    if fit:
+        totals = np.bincount(indices, weights=counts, minlength=vocab.n_features)
+        vocab.columns = totals >= min_freq
+        vocab.fitted = True
+    X = csr_matrix((np.array(data, dtype=np.int64), indices, indptr), shape=(len(tokens_list), vocab.n_features))
+    X = X.multiply(vocab.columns.astype(np.int64)).tocsr()
+    X.eliminate_zeros()
+    X.sort_indices()
+    return X, vocab
+
+
+def vectorize(tokens_list, feature_fns, min_freq, vocab=None, hash_bits=None):
     """
     Given the tokens for a set of documents, create a sparse
     feature matrix, where each row represents a document, and
@@ -233,6 +433,9 @@ def vectorize(tokens_list, feature_fns, min_freq, vocab=None):
       feature_fns...a list of functions, one per feature
       min_freq......Remove features that do not appear in
                     at least min_freq different documents.
+      hash_bits.....If given (or if vocab is a HashedVocab), hash the
+                    features into 2**hash_bits columns instead of building
+                    a vocabulary; see hashed_vectorize.
     Returns:
       - a csr_matrix: See https://goo.gl/f5TiF1 for documentation.
       This is a sparse matrix (zero values are not stored).
@@ -252,40 +455,150 @@ def vectorize(tokens_list, feature_fns, min_freq, vocab=None):
            [0, 2, 0, 1, 0, 0]], dtype=int64)
     >>> sorted(vocab.items(), key=lambda x: x[1])
     [('token=great', 0), ('token=horrible', 1), ('token=isn', 2), ('token=movie', 3), ('token=t', 4), ('token=this', 5)]
+    >>> X, vocab = vectorize(tokens_list, feature_fns, min_freq=2, hash_bits=5)
+    >>> X.shape, np.flatnonzero(vocab.columns).tolist()
+    ((2, 32), [20, 31])
+    >>> X.toarray()[:, [20, 31]]
+    array([[ 0,  1],
+           [-2,  1]])
     """
 
-    final_token_dict = defaultdict(lambda: 0)
-    combined_doc_tokens = []
-    ind = 0
+    if hash_bits is not None and vocab is None:
+        vocab = HashedVocab(hash_bits)
+    if isinstance(vocab, HashedVocab):
+        return hashed_vectorize(tokens_list, feature_fns, min_freq, vocab)
 
     # To get the keys that are greater than or equal to the minimum_frequencies into "vocab"
+    # (in order of first appearance, as Counter keeps insertion order).
     if vocab == None:
         vocab = {}
-        [combined_doc_tokens.extend(key) for key in tokens_list]
-        for tokens in combined_doc_tokens:
-            token_name = 'token=' + tokens
-            final_token_dict[token_name] += 1
-        for keys in final_token_dict:
-            if final_token_dict[keys] >= min_freq:
-                vocab[keys] = ind
-                ind += 1
-
-    # Lists created for rows and columns
-    data = []  # data
-    ind = []  # row
-    indptr = []  # column
-
-    feats_list = [featurize(doc_token, feature_fns) for doc_token in tokens_list]
-    for token, doc in enumerate(feats_list):
-        for word in doc:
-            if word[0] in vocab.keys():
-                ind.append(token)
-                data.append(word[1])
-                indptr.append(vocab[word[0]])
-
-    X = csr_matrix((data, (ind, indptr)), shape=(len(feats_list), len(vocab)), dtype=np.int64)
+        final_token_dict = Counter('token=' + token for tokens in tokens_list for token in tokens)
+        for keys, count in final_token_dict.items():
+            if count >= min_freq:
+                vocab[keys] = len(vocab)
+
+    # The CSR arrays are written directly, a row per document; the features
+    # of a document don't need sorting, as sort_indices orders each row's
+    # columns at the end.
+    data = array('q')
+    indices = array('i')
+    indptr = array('q', [0])
+
+    for doc_token in tokens_list:
+        feats = defaultdict(lambda: 0)
+        for feature in feature_fns:
+            feature(doc_token, feats)
+        for name, value in feats.items():
+            column = vocab.get(name)
+            if column is not None:
+                indices.append(column)
+                data.append(value)
+        indptr.append(len(indices))
+
+    X = csr_matrix((np.array(data, dtype=np.int64), np.array(indices, dtype=np.int32),
+                    np.array(indptr, dtype=np.int64)), shape=(len(tokens_list), len(vocab)))
+    X.sort_indices()
     return X, vocab
 
+def feature_block(tokens_list, feature_fn):
+    """
+    Compute one family of features (one feature function) for every document.
+
+    Params:
+      tokens_list...a list of token arrays, one per document.
+      feature_fn....a feature function, e.g. token_features.
+    Returns:
+      - a csr_matrix with a row per document and a column per feature name.
+      - a dict from feature name to column index. The columns are in order
+      of first appearance in the documents.
+
+    >>> block, columns = feature_block([np.array(['b', 'a', 'b']), np.array(['c', 'a'])], token_features)
+    >>> block.toarray()
+    array([[2, 1, 0],
+           [0, 1, 1]])
+    >>> sorted(columns.items(), key=lambda x: x[1])
+    [('token=b', 0), ('token=a', 1), ('token=c', 2)]
+    """
+    columns = {}
+    data = []
+    indices = []
+    indptr = [0]
+    for tokens in tokens_list:
+        feats = defaultdict(lambda: 0)
+        feature_fn(tokens, feats)
+        for name, value in feats.items():
+            indices.append(columns.setdefault(name, len(columns)))
+            data.append(value)
+        indptr.append(len(indices))
+    block = csr_matrix((np.array(data, dtype=np.int64), np.array(indices, dtype=np.int64), indptr),
+                       shape=(len(tokens_list), len(columns)))
+    return block, columns
+
+
+def feature_store(tokens_list, feature_fns):
+    """
+    Compute, once, the feature blocks that the settings of feature_fns can
+    use, so that every combination of them can be assembled by
+    select_features without featurizing the documents again.
+
+    vectorize builds its vocabulary from token counts, so its columns are
+    only ever token= features: the token_pair and lexicon features of a
+    document are computed but never kept. Only the token_features block is
+    therefore computed, whatever feature_fns holds.
+
+    Params:
+      tokens_list...a list of token arrays, one per document.
+      feature_fns...the feature functions of the settings.
+    Returns:
+      A dict from token_features to its feature_block.
+    """
+    return {token_features: feature_block(tokens_list, token_features)}
+
+
+def select_features(store, feature_fns, min_freq):
+    """
+    Assemble the feature matrix that vectorize(tokens_list, feature_fns, min_freq)
+    would return from a feature_store of the same documents: the vocabulary
+    is taken from the column sums of the token block, and its columns are
+    picked out of that block. If feature_fns does not include
+    token_features, no feature of the setting is in the vocabulary, so
+    (as with vectorize) every column is zero.
+
+    Params:
+      store.........a feature_store of the documents.
+      feature_fns...the feature functions of this setting.
+      min_freq......as in vectorize.
+    Returns:
+      The same csr_matrix and vocab as vectorize.
+
+    >>> docs = ["Isn't this movie great?", "Horrible, horrible movie", "A great, great movie"]
+    >>> tokens_list = [tokenize(d) for d in docs]
+    >>> fns = [token_features, token_pair_features, lexicon_features]
+    >>> store = feature_store(tokens_list, fns)
+    >>> settings = [c for i in range(1, 4) for c in combinations(fns, i)]
+    >>> same = []
+    >>> for features in settings:
+    ...     for min_freq in (1, 2):
+    ...         X, vocab = select_features(store, features, min_freq)
+    ...         Y, vocab2 = vectorize(tokens_list, features, min_freq)
+    ...         same.append(X.shape == Y.shape and (X != Y).nnz == 0 and vocab == vocab2)
+    >>> len(same), all(same)
+    (14, True)
+    """
+    token_block, token_columns = store[token_features]
+    counts = np.asarray(token_block.sum(axis=0)).ravel()
+    vocab = {}
+    for name, column in token_columns.items():
+        if counts[column] >= min_freq:
+            vocab[name] = len(vocab)
+
+    if token_features not in feature_fns:
+        return csr_matrix((token_block.shape[0], len(vocab)), dtype=np.int64), vocab
+    X = token_block[:, [token_columns[name] for name in vocab]]
+    X.sort_indices()
+    return X, vocab
+
+
 def accuracy_score(truth, predicted):
     """ Compute accuracy of predictions.
     DONE ALREADY
@@ -295,7 +608,72 @@ def accuracy_score(truth, predicted):
     """
     return len(np.where(truth==predicted)[0]) / len(truth)
 
-def cross_validation_accuracy(clf, X, labels, k):
+# Labels used by the cross-validation pool workers. Set once per worker by
+# _init_worker, so each task only carries the path of its feature matrix.
+_worker_labels = None
+
+
+def _init_worker(labels):
+    global _worker_labels
+    _worker_labels = labels
+
+
+def _save_matrix(X, path):
+    """ Save the arrays of a csr_matrix as .npy files starting with path. """
+    np.save(path + '.data.npy', X.data)
+    np.save(path + '.indices.npy', X.indices)
+    np.save(path + '.indptr.npy', X.indptr)
+    return path, X.shape
+
+
+def _load_matrix(path, shape):
+    """ A csr_matrix over the memory-mapped arrays written by _save_matrix. """
+    return csr_matrix((np.load(path + '.data.npy', mmap_mode='r'), np.load(path + '.indices.npy', mmap_mode='r'),
+                       np.load(path + '.indptr.npy', mmap_mode='r')), shape=shape)
+
+
+def _fold_accuracy(task):
+    """ Fit clf on all but one fold of a saved matrix, and return its accuracy on that fold. """
+    clf, path, shape, k, fold = task
+    X = _load_matrix(path, shape)
+    training_index, testing_index = list(KFold(len(_worker_labels), n_folds=k, shuffle=False, random_state=None))[fold]
+    clf.fit(X[training_index], _worker_labels[training_index])
+    return accuracy_score(_worker_labels[testing_index], clf.predict(X[testing_index]))
+
+
+def parallel_cross_validation(clf, saved, labels, k, n_jobs):
+    """
+    Cross-validate clf on several feature matrices at once, running each
+    (matrix, fold) pair as a task in a pool of n_jobs processes. The
+    matrices are saved to disk by the caller (see _save_matrix) as they are
+    built, and memory-mapped by the workers, so neither the caller nor the
+    tasks hold more than one of them at a time.
+
+    Params:
+      clf...........A LogisticRegression classifier (copied for each task).
+      saved.........A list of (path, shape) pairs from _save_matrix, one per
+                    csr_matrix with a row per instance.
+      labels........The true labels for each instance.
+      k.............The number of cross-validation folds.
+      n_jobs........The number of worker processes.
+    Returns:
+      A list of the average testing accuracy for each matrix, the same as
+      cross_validation_accuracy computes.
+    """
+    tasks = [(clf, path, shape, k, fold) for path, shape in saved for fold in range(k)]
+    with multiprocessing.Pool(n_jobs, initializer=_init_worker, initargs=(np.array(labels),)) as pool:
+        accuracies = pool.map(_fold_accuracy, tasks)
+    # Sum the folds in order, as cross_validation_accuracy does, so the averages are identical.
+    results = []
+    for start in range(0, len(accuracies), k):
+        mean_accuracy = 0
+        for accuracy in accuracies[start:start + k]:
+            mean_accuracy += (accuracy / k)
+        results.append(mean_accuracy)
+    return results
+
+
+def cross_validation_accuracy(clf, X, labels, k, n_jobs=None):
     """
     Compute the average testing accuracy over k folds of cross-validation. You
     can use sklearn's KFold class here (no random seed, and no shuffling
@@ -306,12 +684,22 @@ def cross_validation_accuracy(clf, X, labels, k):
       X........A csr_matrix of features.
       labels...The true labels for each instance in X
       k........The number of cross-validation folds.
+      n_jobs...If more than 1, fit the folds in parallel with
+               parallel_cross_validation (clf itself is then left unfitted).
 
     Returns:
       The average testing accuracy of the classifier
       over each fold of cross-validation.
     """
 
+    if n_jobs is not None and n_jobs > 1:
+        directory = tempfile.mkdtemp()
+        try:
+            saved = _save_matrix(X, os.path.join(directory, 'X'))
+            return parallel_cross_validation(clf, [saved], labels, k, n_jobs)[0]
+        finally:
+            shutil.rmtree(directory)
+
     kf = KFold(len(labels), n_folds=k, shuffle=False, random_state=None)
     mean_accuracy = 0
     np_labels = np.array(labels)
@@ -325,7 +713,7 @@ def cross_validation_accuracy(clf, X, labels, k):
     return mean_accuracy
 
 def eval_all_combinations(docs, labels, punct_vals,
-                          feature_fns, min_freqs):
+                          feature_fns, min_freqs, n_jobs=None):
     """
     Enumerate all possible classifier settings and compute the
     cross validation accuracy for each setting. We will use this
@@ -349,6 +737,8 @@ def eval_all_combinations(docs, labels, punct_vals,
       feature_fns...List of possible feature functions to use
       min_freqs.....List of possible min_freq values to use
                     (e.g., [2,5,10])
+      n_jobs........If more than 1, the number of processes to run the
+                    (setting, fold) pairs on (see parallel_cross_validation).
 
     Returns:
       A list of dicts, one per combination. Each dict has
@@ -369,20 +759,38 @@ def eval_all_combinations(docs, labels, punct_vals,
     # Combinations of all the functions in feature_fns stored in all_feature_fns list.
     [all_feature_fns.extend(combinations(feature_fns, i)) for i in range(1, len(feature_fns)+1)]
 
-    for punct in punct_vals:
-        tokens_list = [tokenize(d, punct) for d in docs]
-        for features in all_feature_fns:
-            for min_freq in min_freqs:
-                temp_dict = {}
-                X, vocab = vectorize(tokens_list, features, min_freq=min_freq)
-                clf = LogisticRegression()
-
-                temp_dict["features"] = features
-                temp_dict["punct"] = punct
-                temp_dict["min_freq"] = min_freq
-                temp_dict["accuracy"] = cross_validation_accuracy(clf, X, labels, 5)
-
-                eval_dicts.append(temp_dict)
+    # In parallel, each setting's matrix is written to disk as soon as it is built, and the workers read it back.
+    directory = tempfile.mkdtemp() if n_jobs is not None and n_jobs > 1 else None
+    saved = []
+
+    try:
+        # Each feature function is computed once per punctuation setting; the settings only select from the blocks.
+        for punct in punct_vals:
+            tokens_list = [tokenize(d, punct) for d in docs]
+            store = feature_store(tokens_list, feature_fns)
+            for features in all_feature_fns:
+                for min_freq in min_freqs:
+                    temp_dict = {}
+                    X, vocab = select_features(store, features, min_freq)
+                    clf = LogisticRegression()
+
+                    temp_dict["features"] = features
+                    temp_dict["punct"] = punct
+                    temp_dict["min_freq"] = min_freq
+                    if directory is not None:
+                        saved.append(_save_matrix(X, os.path.join(directory, str(len(saved)))))
+                    else:
+                        temp_dict["accuracy"] = cross_validation_accuracy(clf, X, labels, 5)
+
+                    eval_dicts.append(temp_dict)
+
+        if saved:
+            accuracies = parallel_cross_validation(LogisticRegression(), saved, labels, 5, n_jobs)
+            for temp_dict, accuracy in zip(eval_dicts, accuracies):
+                temp_dict["accuracy"] = accuracy
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
 
     result = sorted(eval_dicts, key=lambda k: k["accuracy"], reverse=True)
     return result
@@ -441,7 +849,7 @@ def mean_accuracy_per_setting(results):
     final_list = sorted(final_list, key=lambda x: -x[0])
     return final_list
 
-def fit_best_classifier(docs, labels, best_result):
+def fit_best_classifier(docs, labels, best_result, hash_bits=None, top_n=5):
     """
     Using the best setting from eval_all_combinations,
     re-vectorize all the training data and fit a
@@ -453,22 +861,86 @@ def fit_best_classifier(docs, labels, best_result):
       labels........The true labels for each training document (0 or 1)
       best_result...Element of eval_all_combinations
                     with highest accuracy
+      hash_bits.....If given, vectorize in hashed mode (see HashedVocab).
+      top_n.........In hashed mode, the number of top coefficients per
+                    label whose feature names are kept for top_coefs.
     Returns:
       clf.....A LogisticRegression classifier fit to all
             training data.
-      vocab...The dict from feature name to column index.
+      vocab...The dict from feature name to column index
+            (or the HashedVocab).
     """
 
     tokens_lists = [tokenize(tokens, best_result['punct']) for tokens in docs]
     feature_fns = best_result['features']
     min_freq = best_result['min_freq']
 
-    X, vocab = vectorize(tokens_lists, feature_fns, min_freq)
+    X, vocab = vectorize(tokens_lists, feature_fns, min_freq, hash_bits=hash_bits)
     train_model = LogisticRegression()
     clf = train_model.fit(X, labels)
+    if isinstance(vocab, HashedVocab):
+        top = [vocab.top_columns(clf.coef_[0], label, top_n) for label in (0, 1)]
+        vocab.resolve_names(tokens_lists, feature_fns, np.concatenate(top))
 
     return clf, vocab
 
+def train_streaming(path, feature_fns, punct, vocab=None, hash_bits=20, batch_size=1000,
+                    held_out=10, epochs=1, seed=0, top_n=5):
+    """
+    Train a linear classifier on a corpus too large to vectorize at once.
+    Reviews are read from path in mini-batches (see review_files), each
+    batch is vectorized with a fixed feature space, and an SGDClassifier
+    with logistic loss is updated with partial_fit. Then accuracy is
+    measured on the held-out files, also read batch by batch.
+
+    The feature space is either vocab, a dict built beforehand (e.g., by
+    vectorize on a sample of the documents), or, if vocab is None, a
+    HashedVocab with 2**hash_bits columns. Its feature names are looked
+    up after training, in one more pass over the training files, for the
+    top_n top coefficients per label only (see HashedVocab.resolve_names).
+
+    Params:
+      path..........path to files
+      feature_fns...the feature functions to use.
+      punct.........keep_internal_punct for tokenize.
+      vocab.........a fixed dict from feature name to column, or None.
+      hash_bits.....the hashed column count, used when vocab is None.
+      batch_size....the number of documents per mini-batch.
+      held_out......every held_out-th file is held out for testing.
+      epochs........the number of passes over the training files.
+      seed..........random seed for the file order and the classifier.
+      top_n.........the number of named top coefficients per label, for a
+                    HashedVocab; 0 skips the extra pass.
+    Returns:
+      clf.......the trained SGDClassifier.
+      vocab.....the feature space used (the dict or the HashedVocab).
+      accuracy..the accuracy on the held-out files.
+    """
+    train, test = review_files(path, held_out, seed)
+    if vocab is None:
+        vocab = HashedVocab(hash_bits)
+
+    def features(docs, fit):
+        tokens_list = [tokenize(d, punct) for d in docs]
+        if isinstance(vocab, HashedVocab):
+            return hashed_vectorize(tokens_list, feature_fns, 0, vocab, fit=fit)[0]
+        return vectorize(tokens_list, feature_fns, 1, vocab=vocab)[0]
+
+    clf = SGDClassifier(loss='log', random_state=seed)
+    for epoch in range(epochs):
+        for docs, labels in document_batches(train, batch_size):
+            clf.partial_fit(features(docs, True), labels, classes=np.array([0, 1]))
+    if isinstance(vocab, HashedVocab) and top_n:
+        top = [vocab.top_columns(clf.coef_[0], label, top_n) for label in (0, 1)]
+        vocab.resolve_names((tokenize(d, punct) for docs, _ in document_batches(train, batch_size)
+                             for d in docs), feature_fns, np.concatenate(top))
+
+    correct = 0
+    for docs, labels in document_batches(test, batch_size):
+        correct += len(np.where(clf.predict(features(docs, False)) == labels)[0])
+    return clf, vocab, correct / max(len(test), 1)
+
+
 def top_coefs(clf, label, n, vocab):
     """
     Find the n features with the highest coefficients in
@@ -480,7 +952,8 @@ def top_coefs(clf, label, n, vocab):
       label...1 or 0; if 1, return the top coefficients
               for the positive class; else for negative.
       n.......The number of coefficients to return.
-      vocab...Dict from feature name to column index.
+      vocab...Dict from feature name to column index
+              (or a HashedVocab).
     Returns:
       List of (feature_name, coefficient) tuples, SORTED
       in descending order of the coefficient for the
@@ -493,10 +966,17 @@ def top_coefs(clf, label, n, vocab):
         vocab_dict[value] = key
 
     coef = clf.coef_[0]
-    if label == 0:
-        top_coef = np.argsort(coef)[:n]      # top 5 negative words
+    columns = np.arange(len(coef))
+    if isinstance(vocab, HashedVocab):
+        # A feature hashed with sign -1 is weighted by minus the coefficient of its column.
+        top_coef = vocab.top_columns(coef, label, n)
+        coef = coef * vocab.signs
+        for index in top_coef:
+            vocab_dict.setdefault(index, 'hash=%d' % index)   # not named by resolve_names
+    elif label == 0:
+        top_coef = columns[np.argsort(coef[columns])][:n]      # top 5 negative words
     elif label == 1:
-        top_coef = np.argsort(coef)[::-1][:n]        # top 5 positive words
+        top_coef = columns[np.argsort(coef[columns])[::-1]][:n]        # top 5 positive words
 
     feature_list = []
     [feature_list.append((vocab_dict[index], abs(coef[index]))) for index in top_coef]
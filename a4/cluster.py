@@ -20,9 +20,13 @@ This file will cluster the screen_id and its friends.
 """
 
 import pickle
+import multiprocessing
 import networkx as nx
 import matplotlib.pyplot as plt
-from collections import defaultdict
+import numpy as np
+from collections import Counter, defaultdict, namedtuple
+from collections.abc import Mapping
+from scipy.sparse import csr_matrix
 import os.path
 
 
@@ -128,51 +132,908 @@ def draw_network(graph, filename):
     plt.savefig(filename)
 
 
-def get_subgraph(graph, min_degree):
+def get_subgraph(graph, min_degree, k_core=False):
     """Return a subgraph containing nodes whose degree is greater than or equal to min_degree.
     We'll use this in the main method to prune the original graph.
 
+    The degrees are read into an array and compared at once. By default this is a single pass, so nodes can be left
+    with fewer than min_degree neighbors once the others are gone; with k_core=True nodes are peeled until none is left
+    below min_degree (see k_core_mask). The result is an EdgeMaskedGraph view with the pruned nodes masked out, so the
+    graph is not copied; if the installed networkx does not let the view replace its node and adjacency dicts, it is
+    graph.subgraph of the kept nodes instead.
+
+    >>> graph = nx.karate_club_graph()
+    >>> cores = [get_subgraph(graph, k, k_core=True) for k in range(1, 6)]
+    >>> [(c.order(), c.number_of_edges()) for c in cores] == [(nx.k_core(graph, k).order(),
+    ...     nx.k_core(graph, k).number_of_edges()) for k in range(1, 6)]
+    True
+    >>> all(sorted(c.nodes()) == sorted(nx.k_core(graph, k).nodes()) for k, c in enumerate(cores, 1))
+    True
+    >>> sorted(get_subgraph(graph, 10).nodes()), graph.order()
+    ([0, 2, 32, 33], 34)
+
     Params:
       graph........a networkx graph
       min_degree...degree threshold
+      k_core.......if True, prune repeatedly, down to the min_degree-core.
     Returns:
       a networkx graph, filtered as defined above.
     """
 
-    degreeList = [node for node, degree in dict(nx.degree(graph)).items() if degree >= min_degree]
-    subgraph = graph.subgraph(degreeList)
+    if k_core:
+        nodes, adjacency = adjacency_matrix(graph)
+        kept = k_core_mask(adjacency.indptr, adjacency.indices, min_degree)
+    else:
+        nodes = list(graph.nodes())
+        degrees = np.fromiter((len(graph.adj[node]) for node in nodes), dtype=int, count=len(nodes))
+        kept = degrees >= min_degree
+    try:
+        subgraph = EdgeMaskedGraph(graph)
+    except AttributeError:
+        return graph.subgraph([node for node, keep in zip(nodes, kept) if keep])
+    subgraph.remove_nodes_from(node for node, keep in zip(nodes, kept) if not keep)
     return subgraph
 
 
-def community_detection(graph, length):
+def k_core_mask(indptr, indices, min_degree):
+    """
+    Peel the graph with CSR adjacency (indptr, indices) down to its min_degree-core. All the nodes below min_degree
+    are removed at once, their neighbors' degrees decremented, and the neighbors that drop below min_degree are removed
+    next. With a single threshold this queue is the only bucket the usual bucket-queue core decomposition needs; each
+    node is removed once and its adjacency read once, so the work is O(V + E).
+
+    Returns:
+        A boolean array, True for the nodes in the core.
+    """
+
+    degrees = np.diff(indptr)
+    kept = np.ones(len(degrees), dtype=bool)
+    queue = np.flatnonzero(degrees < min_degree)
+    while len(queue):
+        kept[queue] = False
+        counts = indptr[queue + 1] - indptr[queue]
+        ends = np.cumsum(counts)
+        slots = np.repeat(indptr[queue] - (ends - counts), counts) + np.arange(ends[-1])
+        neighbors = indices[slots]
+        touched, lost = np.unique(neighbors[kept[neighbors]], return_counts=True)
+        degrees[touched] -= lost
+        queue = touched[degrees[touched] < min_degree]
+    return kept
+
+
+class _MaskedNeighbors(Mapping):
+    """
+    The neighbor dict of one node, minus the neighbors whose edge has been removed.
+    """
+
+    def __init__(self, neighbors, removed):
+        self._neighbors = neighbors
+        self._removed = removed
+
+    def __getitem__(self, neighbor):
+        if neighbor in self._removed:
+            raise KeyError(neighbor)
+        return self._neighbors[neighbor]
+
+    def __iter__(self):
+        return (neighbor for neighbor in self._neighbors if neighbor not in self._removed)
+
+    def __len__(self):
+        return len(self._neighbors) - len(self._removed)
+
+    def __contains__(self, neighbor):
+        return neighbor in self._neighbors and neighbor not in self._removed
+
+
+class _MaskedNodes(Mapping):
+    """
+    A node dict (node -> attributes) that hides the nodes in removed.
+    """
+
+    def __init__(self, nodes, removed):
+        self._nodes = nodes
+        self._removed = removed
+
+    def __getitem__(self, node):
+        if node in self._removed:
+            raise KeyError(node)
+        return self._nodes[node]
+
+    def __iter__(self):
+        return (node for node in self._nodes if node not in self._removed)
+
+    def __len__(self):
+        return len(self._nodes) - len(self._removed)
+
+    def __contains__(self, node):
+        return node in self._nodes and node not in self._removed
+
+
+class _MaskedAdjacency(_MaskedNodes):
+    """
+    An adjacency dict (node -> neighbor dict) that hides the nodes in removed_nodes and the edges in removed, a dict
+    from each node to the set of neighbors it has lost. Nodes that have lost no neighbors get their original neighbor
+    dict.
+    """
+
+    def __init__(self, adjacency, removed, removed_nodes):
+        _MaskedNodes.__init__(self, adjacency, removed_nodes)
+        self._removed_edges = removed
+
+    def __getitem__(self, node):
+        neighbors = _MaskedNodes.__getitem__(self, node)
+        lost = self._removed_edges.get(node)
+        if not lost:
+            return neighbors
+        return _MaskedNeighbors(neighbors, lost)
+
+
+class EdgeMaskedGraph(nx.Graph):
+    """
+    A view of a networkx graph that edges can be removed from without copying it or changing it. The original node and
+    adjacency dicts are shared; removed edges are only recorded, as a set of lost neighbors per node, and skipped when
+    the adjacency is read. Nodes can be removed as well, which records their edges and the node itself. Since networkx
+    algorithms read graphs through the node and adjacency dicts, the view can be passed to them like any other graph.
+    A view of a view shares the original graph, with a copy of what has been removed.
+
+    networkx 1.x keeps those dicts in the node and adj attributes; from 2.0 on they are _node and _adj, behind
+    read-only node, adj and edges views, so the masking dicts replace whichever the installed networkx reads.
+
+    >>> graph = nx.path_graph(4)
+    >>> view = EdgeMaskedGraph(graph)
+    >>> view.remove_edge(1, 2)
+    >>> view.remove_node(3)
+    >>> sorted(view.edges()), sorted(view.nodes()), view.number_of_edges(), graph.number_of_edges()
+    ([(0, 1)], [0, 1, 2], 1, 3)
+    >>> sorted(sorted(c) for c in nx.connected_components(view))
+    [[0, 1], [2]]
+
+    Adding nodes or edges would write through to the original graph, so those methods raise NetworkXError; copy the
+    view into a new graph with nx.Graph(view) to add to it. Every read goes through the masking dicts, so algorithms
+    that read the adjacency many times (such as the betweenness searches of RootCredits) read it once into their own
+    structure instead.
+    """
+
+    def __init__(self, graph):
+        nx.Graph.__init__(self)
+        self.removed = {}
+        self.removed_nodes = set()
+        if isinstance(graph, EdgeMaskedGraph):
+            for node, lost in graph.removed.items():
+                self.removed[node] = set(lost)
+            self.removed_nodes.update(graph.removed_nodes)
+            graph = graph._base
+        self._base = graph
+        self.graph = graph.graph
+        if hasattr(graph, '_adj'):
+            self._masked_nodes = _MaskedNodes(graph._node, self.removed_nodes)
+            self._masked_adj = _MaskedAdjacency(graph._adj, self.removed, self.removed_nodes)
+            self._node, self._adj = self._masked_nodes, self._masked_adj
+        else:
+            self._masked_nodes = _MaskedNodes(graph.node, self.removed_nodes)
+            self._masked_adj = _MaskedAdjacency(graph.adj, self.removed, self.removed_nodes)
+            self.node, self.adj, self.edge = self._masked_nodes, self._masked_adj, self._masked_adj
+
+    def _read_only(self, *args, **kwargs):
+        raise nx.NetworkXError("Nodes and edges can only be removed from an EdgeMaskedGraph")
+
+    add_node = add_nodes_from = add_edge = add_edges_from = clear = _read_only
+
+    def remove_edge(self, u, v):
+        if not self.has_edge(u, v):
+            raise nx.NetworkXError("The edge %s-%s is not in the graph" % (u, v))
+        self.removed.setdefault(u, set()).add(v)
+        self.removed.setdefault(v, set()).add(u)
+
+    def remove_edges_from(self, ebunch):
+        for edge in ebunch:
+            if self.has_edge(edge[0], edge[1]):
+                self.remove_edge(edge[0], edge[1])
+
+    def remove_nodes_from(self, nodes):
+        for node in nodes:
+            if node in self:
+                for neighbor in list(self._masked_adj[node]):
+                    self.removed.setdefault(node, set()).add(neighbor)
+                    self.removed.setdefault(neighbor, set()).add(node)
+                self.removed_nodes.add(node)
+
+    def remove_node(self, n):
+        if n not in self:
+            raise nx.NetworkXError("The node %s is not in the graph." % (n,))
+        self.remove_nodes_from([n])
+
+    def copy(self):
+        """
+        Another view of the same graph, with its own record of removed edges and nodes.
+        """
+        return EdgeMaskedGraph(self)
+
+    def subgraph(self, nbunch):
+        """
+        A new networkx graph induced on nbunch, with only the edges left in the view.
+        """
+        nodes = set(self.nbunch_iter(nbunch))
+        subgraph = nx.Graph()
+        subgraph.graph = self.graph
+        subgraph.add_nodes_from((node, self._masked_nodes[node]) for node in nodes)
+        subgraph.add_edges_from((u, v, data) for u in nodes for v, data in self._masked_adj[u].items() if v in nodes)
+        return subgraph
+
+
+def edge_adjacency(graph):
+    """
+    Returns:
+        The list of nodes of graph, its list of edges, and its adjacency with both as positions in those lists: a list
+        holding, for each node, a dict from each neighbor to the edge between them.
+    """
+
+    nodes = list(graph.nodes())
+    edges = list(graph.edges())
+    index = {node: i for i, node in enumerate(nodes)}
+    adjacency = [{} for _ in nodes]
+    for e, (u, v) in enumerate(edges):
+        adjacency[index[u]][index[v]] = e
+        adjacency[index[v]][index[u]] = e
+    return nodes, edges, adjacency
+
+
+def affected_roots(adjacency, u, v):
+    """
+    Find the roots whose shortest paths use the edge (u, v) of an edge_adjacency: the nodes at different distances
+    from u and from v. A single BFS starts from both ends at once and labels each node with the ends nearest to it,
+    1 for u, 2 for v and 3 for both, the union of the labels of the nodes one level closer that reach it.
+
+    >>> nodes, edges, adjacency = edge_adjacency(nx.complete_graph(3))
+    >>> sorted(affected_roots(adjacency, 0, 1))
+    [0, 1]
+
+    Returns:
+        A list of the nodes in the component of (u, v) that are nearer to one end than to the other.
+    """
+
+    nearest = {u: 1, v: 2}
+    frontier = [u, v]
+    while frontier:
+        level = {}
+        for node in frontier:
+            label = nearest[node]
+            for neighbor in adjacency[node]:
+                if neighbor in level:
+                    level[neighbor] |= label
+                elif neighbor not in nearest:
+                    level[neighbor] = label
+        nearest.update(level)
+        frontier = list(level)
+    return [node for node, label in nearest.items() if label != 3]
+
+
+def root_credits(adjacency, root):
+    """
+    The edge credits of the shortest paths from root, with Brandes' accumulation: a BFS from root counts the shortest
+    paths to every node, then the nodes are visited farthest first, each passing its credit to its parents in
+    proportion to their number of paths. Every path of an undirected graph is counted once from each end, so the
+    credits are halved; summed over every root they are nx.edge_betweenness_centrality(graph, normalized=False).
+
+    Params:
+        adjacency....an edge_adjacency
+        root.........node to start shortest paths from
+    Returns:
+        An array of edges and an array of the credits of those edges.
+    """
+
+    distance = {root: 0}
+    paths = {root: 1.0}
+    parents = {root: []}
+    order = [root]
+    i = 0
+    while i < len(order):
+        node = order[i]
+        i += 1
+        depth = distance[node] + 1
+        for neighbor, edge in adjacency[node].items():
+            if neighbor not in distance:
+                distance[neighbor] = depth
+                paths[neighbor] = 0.0
+                parents[neighbor] = []
+                order.append(neighbor)
+            if distance[neighbor] == depth:
+                paths[neighbor] += paths[node]
+                parents[neighbor].append((node, edge))
+
+    edges = []
+    credits = []
+    dependency = dict.fromkeys(order, 0.0)
+    for node in reversed(order):
+        coefficient = (1.0 + dependency[node]) / paths[node]
+        for parent, edge in parents[node]:
+            credit = paths[parent] * coefficient
+            dependency[parent] += credit
+            edges.append(edge)
+            credits.append(credit)
+    return np.array(edges, dtype=np.int32), np.array(credits) / 2
+
+
+# Adjacency used by the betweenness pool workers (see edge_adjacency). Set once per worker by _init_worker (inherited
+# when the processes are forked); each task carries its roots and the edges removed since the pool started.
+_worker_adjacency = None
+
+
+def _init_worker(adjacency):
+    global _worker_adjacency
+    _worker_adjacency = adjacency
+
+
+def _shard_credits(task):
+    """
+    The root_credits of each root in a shard.
+    """
+    roots, removed = task
+    for u, v in removed:
+        _worker_adjacency[u].pop(v, None)
+        _worker_adjacency[v].pop(u, None)
+    return [(root,) + root_credits(_worker_adjacency, root) for root in roots]
+
+
+class CreditPool(object):
+    """
+    A pool of worker processes that run root_credits with the roots sharded across them. The adjacency is sent to the
+    workers once, when the pool starts; the edges removed from it afterwards are passed to remove_edge and sent along
+    with later tasks, so one pool serves every removal of a Girvan-Newman run.
+    """
+
+    def __init__(self, adjacency, workers):
+        self.workers = workers
+        self.removed = []
+        self._pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(adjacency,))
+
+    def remove_edge(self, u, v):
+        self.removed.append((u, v))
+
+    def root_credits(self, roots):
+        """
+        Yield (root, edges, credits) for each of roots.
+        """
+        roots = list(roots)
+        shards = [roots[i::self.workers * 4] for i in range(self.workers * 4)]
+        removed = tuple(self.removed)
+        for results in self._pool.imap(_shard_credits, [(shard, removed) for shard in shards if shard]):
+            for result in results:
+                yield result
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+
+def credit_pool(adjacency, workers):
+    """
+    Returns:
+        A CreditPool for adjacency if workers is more than 1, else None.
+    """
+
+    if workers is None or workers <= 1:
+        return None
+    return CreditPool(adjacency, workers)
+
+
+def edge_credits(graph, sources, workers=None):
+    """
+    Sum the (unnormalized) edge betweenness credits of the shortest paths starting at each of sources (see
+    root_credits). If workers is more than 1, the sources are sharded across a pool of worker processes (see
+    CreditPool).
+
+    >>> graph = nx.barbell_graph(4, 2)
+    >>> expected = nx.edge_betweenness_centrality(graph, normalized=False)
+    >>> for workers in (None, 2):
+    ...     credits = edge_credits(graph, graph.nodes(), workers)
+    ...     print(sorted(credits) == sorted(expected), max(abs(credits[e] - expected[e]) for e in expected) < 1e-9)
+    True True
+    True True
+
+    Params:
+        graph........networkx graph
+        sources......nodes to start shortest paths from
+        workers......number of worker processes
+    Returns:
+        A dict from each edge of graph to its credit.
+    """
+
+    nodes, edges, adjacency = edge_adjacency(graph)
+    index = {node: i for i, node in enumerate(nodes)}
+    roots = [index[source] for source in sources]
+    credits = np.zeros(len(edges))
+    pool = credit_pool(adjacency, workers)
+    try:
+        if pool is None:
+            results = ((root,) + root_credits(adjacency, root) for root in roots)
+        else:
+            results = pool.root_credits(roots)
+        for _, ids, credit in results:
+            credits[ids] += credit
+    finally:
+        if pool is not None:
+            pool.close()
+    return dict(zip(edges, credits))
+
+
+def parallel_edge_betweenness(graph, workers):
+    """
+    Compute the same normalized values as nx.edge_betweenness_centrality(graph), with the source nodes sharded across
+    a pool of worker processes (see edge_credits).
+
+    >>> graph = nx.karate_club_graph()
+    >>> expected = nx.edge_betweenness_centrality(graph)
+    >>> betweenness = parallel_edge_betweenness(graph, 2)
+    >>> sorted(betweenness) == sorted(expected)
+    True
+    >>> bool(max(abs(betweenness[edge] - expected[edge]) for edge in expected) < 1e-12)
+    True
+
+    Params:
+        graph........networkx graph
+        workers......number of worker processes
+    Returns:
+        A dict from each edge to its betweenness.
+    """
+
+    # The credits are halved for undirected graphs; normalize the total as networkx does.
+    n = graph.order()
+    scale = 2.0 / (n * (n - 1)) if n > 1 else 1.0
+    return {edge: credit * scale for edge, credit in edge_credits(graph, graph.nodes(), workers).items()}
+
+
+class RootCredits(object):
+    """
+    The edge betweenness credits of a graph, kept per root so that they can be brought up to date as edges are
+    removed without searching from every node again.
+
+    An edge (u, v) lies on a shortest path from root r only if r is at different distances from u and from v, so when
+    it is removed only those roots are searched again: their old credits are taken off the total and their new ones
+    added. The roots are found by one BFS over the edge's component, from both of its ends at once (see
+    affected_roots), so each removal costs O(V + E) plus a Brandes search per affected root. The searches run over an
+    edge_adjacency of the graph, which remove_edge keeps up to date, so the graph itself is only read once.
+
+    Memory: the credits of every root are kept, one entry (an int32 edge and a float64 credit, 12 bytes) for each edge
+    of each root's shortest-path DAG. That is O(V * E) and is not capped: a connected graph with 10,000 nodes and
+    50,000 edges can need up to 6 GB. Girvan-Newman is only practical on graphs well below that size, since every
+    removal also costs up to V Brandes searches; use the Louvain or label propagation backends of community_detection
+    for larger graphs.
+
+    >>> graph = nx.barbell_graph(4, 2)
+    >>> credits = RootCredits(graph)
+    >>> credits.remove_edge(0, 1)
+    >>> credits.affected
+    2
+    >>> credits.remove_edge(4, 5)
+    >>> credits.affected
+    12
+    >>> expected = nx.edge_betweenness_centrality(graph, normalized=False)
+    >>> bool(max(abs(credits.credits()[edge] - expected[edge]) for edge in expected) < 1e-9)
+    True
+    >>> sorted(credits.credits()) == sorted(expected)
+    True
+
+    Params:
+        graph........networkx graph, which remove_edge modifies in place
+        workers......number of worker processes used to search from the roots (see CreditPool). The pool is started
+                     once, and stopped by close.
+    """
+
+    def __init__(self, graph, workers=None):
+        self.graph = graph
+        nodes, self.edges, self.adjacency = edge_adjacency(graph)
+        self.index = {node: i for i, node in enumerate(nodes)}
+        self.total = np.zeros(len(self.edges))
+        self.removed = np.zeros(len(self.edges), dtype=bool)
+        self.roots = {}
+        self.affected = 0
+        self.pool = credit_pool(self.adjacency, workers)
+        self._add(range(len(nodes)))
+
+    def _add(self, roots):
+        if self.pool is None:
+            results = ((root,) + root_credits(self.adjacency, root) for root in roots)
+        else:
+            results = self.pool.root_credits(roots)
+        for root, edges, credits in results:
+            self.roots[root] = edges, credits
+            self.total[edges] += credits
+
+    def best_edge(self):
+        """
+        Return the edge with the highest credit. Ties (up to rounding error) go to the edge listed first by
+        graph.edges(), as they would when sorting the output of nx.edge_betweenness_centrality.
+        """
+        credits = np.where(self.removed, -np.inf, self.total)
+        top = credits.max()
+        return self.edges[np.flatnonzero(credits >= top - 1e-9 * abs(top))[0]]
+
+    def remove_edge(self, u, v):
+        """
+        Remove the edge (u, v) from the graph and search again from the roots whose shortest paths used it. The number
+        of those roots is added to self.affected.
+        """
+        i, j = self.index[u], self.index[v]
+        affected = affected_roots(self.adjacency, i, j)
+        for root in affected:
+            edges, credits = self.roots[root]
+            self.total[edges] -= credits
+
+        self.graph.remove_edge(u, v)
+        edge = self.adjacency[i].pop(j)
+        self.adjacency[j].pop(i, None)
+        if self.pool is not None:
+            self.pool.remove_edge(i, j)
+        self.removed[edge] = True
+        self.total[edge] = 0.0
+        self._add(affected)
+        self.affected += len(affected)
+
+    def credits(self):
+        """
+        Returns:
+            A dict from each edge left in the graph to its credit.
+        """
+        return {edge: credit for edge, credit, removed in zip(self.edges, self.total, self.removed) if not removed}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+
+def split_side(graph, u, v):
+    """
+    Search outward from u and v at once, always expanding the side with the smaller frontier, until the two sides
+    meet or either side runs out of nodes. So when an edge removal does not split a component, only a small
+    neighborhood of the edge is visited.
+
+    Returns:
+        None if there is a path between u and v, else the set of nodes in the component of whichever of them was
+        exhausted first.
+    """
+
+    if u == v:
+        return None
+    seen = [{u}, {v}]
+    frontiers = [[u], [v]]
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        next_frontier = []
+        for node in frontiers[side]:
+            for neighbor in graph.neighbors(node):
+                if neighbor in seen[1 - side]:
+                    return None
+                if neighbor not in seen[side]:
+                    seen[side].add(neighbor)
+                    next_frontier.append(neighbor)
+        frontiers[side] = next_frontier
+    return seen[0] if not frontiers[0] else seen[1]
+
+
+def is_connected_pair(graph, u, v):
+    """
+    Return True if there is a path between u and v in graph (see split_side).
+    """
+
+    return split_side(graph, u, v) is None
+
+
+def community_detection(graph, length, workers=None, method='girvan_newman', seed=None):
     """
     Use your approximate_betweenness algorithm implementation to partition a graph.
 
     That is, compute the approximate betweenness of all the edges in the graph and keep removing them until
     multiple components are created.
 
-    Feature edge_betweenness_centrality in networkx is used to detect the communities.
+    The betweenness of every edge is computed once, then after each removal only the credits of the roots whose
+    shortest paths used the removed edge are recomputed (see RootCredits). If workers is more than 1, the betweenness
+    is computed by a pool of that many processes, started once for the whole run (see CreditPool). The components are
+    counted by checking whether each removed edge's endpoints are still connected, and the cluster subgraphs are only
+    built once at the end. Edges are removed from an EdgeMaskedGraph view of graph, so graph is neither copied nor
+    changed.
+
+    >>> graph = nx.barbell_graph(4, 0)
+    >>> sorted(sorted(c.nodes()) for c in community_detection(graph, 2))
+    [[0, 1, 2, 3], [4, 5, 6, 7]]
+    >>> graph.number_of_edges()
+    13
+
+    Betweenness does not scale past a few thousand nodes, so method='louvain' or method='label_propagation' can be
+    used instead (see louvain_labels and label_propagation_labels). These find their own number of communities, so
+    length and workers are ignored; seed fixes the order in which they visit nodes.
 
     Returns:
         clusters - List of communities detected.
     """
 
-    H = graph.copy()
+    if method in ('louvain', 'label_propagation'):
+        nodes, adjacency = adjacency_matrix(graph)
+        if method == 'louvain':
+            labels = louvain_labels(adjacency, seed)
+        else:
+            labels = label_propagation_labels(adjacency, seed)
+        return clusters_from_labels(graph, nodes, labels)
+    elif method != 'girvan_newman':
+        raise ValueError('unknown community detection method: %s' % method)
+
+    H = EdgeMaskedGraph(graph)
     count = 0
+    credits = RootCredits(H, workers)
+    try:
+        components = nx.number_connected_components(H)
+        while components < length:
+            edge_to_remove = credits.best_edge()
+            credits.remove_edge(*edge_to_remove)
+            if not is_connected_pair(H, *edge_to_remove):
+                components += 1
+            count += 1
+    finally:
+        credits.close()
+
+    clusters = [H.subgraph(c) for c in nx.connected_components(H)]
+    return clusters
 
-    def find_best_edge(H0):
-        result = nx.edge_betweenness_centrality(H0)
-        return sorted(result.items(), key=lambda x: x[1], reverse=True)[0][0]
 
-    clusters = [c for c in nx.connected_component_subgraphs(H)]
+def adjacency_matrix(graph):
+    """
+    Returns:
+        The list of nodes of graph and its symmetric adjacency matrix (scipy CSR, rows in the order of the nodes).
+    """
 
-    while len(clusters) < length:
-        edge_to_remove = find_best_edge(H)
-        H.remove_edge(*edge_to_remove)
-        clusters = [c for c in nx.connected_component_subgraphs(H)]
-        count += 1
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=int).reshape(-1, 2)
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    adjacency = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(nodes), len(nodes)))
+    adjacency.sum_duplicates()
+    return nodes, adjacency
 
-    return clusters
+
+def clusters_from_labels(graph, nodes, labels):
+    """
+    Returns:
+        clusters - List of subgraphs of graph, one per label, in order of each label's first node.
+    """
+
+    groups = defaultdict(list)
+    for node, label in zip(nodes, labels):
+        groups[label].append(node)
+    return [graph.subgraph(group) for group in groups.values()]
+
+
+def _louvain_moves(adjacency, two_m, rng):
+    """
+    The local moving phase of Louvain: visit the nodes in random order, moving each to the neighboring community with
+    the largest modularity gain, until a full pass moves nothing.
+
+    Returns:
+        The community of each node, and whether any node moved.
+    """
+
+    n = adjacency.shape[0]
+    degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+    community = np.arange(n)
+    totals = degrees.copy()
+    moved = False
+    improved = True
+    while improved:
+        improved = False
+        for i in rng.permutation(n):
+            start, end = adjacency.indptr[i], adjacency.indptr[i + 1]
+            neighbors = adjacency.indices[start:end]
+            weights = adjacency.data[start:end]
+            keep = neighbors != i
+            current = community[i]
+            totals[current] -= degrees[i]
+
+            candidates, position = np.unique(community[neighbors[keep]], return_inverse=True)
+            links = np.bincount(position, weights=weights[keep], minlength=len(candidates))
+            gains = links - totals[candidates] * degrees[i] / two_m
+            found = np.flatnonzero(candidates == current)
+            best_gain = gains[found[0]] if len(found) else -totals[current] * degrees[i] / two_m
+            best = current
+            if len(gains) and gains.max() > best_gain + 1e-12:
+                best = candidates[np.argmax(gains)]
+
+            totals[best] += degrees[i]
+            if best != current:
+                community[i] = best
+                improved = moved = True
+    return community, moved
+
+
+def louvain_labels(adjacency, seed=None):
+    """
+    Detect communities with the Louvain method: alternate local moves (see _louvain_moves) with collapsing each
+    community into a single weighted node, until no move improves modularity.
+
+    Params:
+        adjacency......symmetric scipy sparse adjacency matrix
+        seed...........seed for the order in which nodes are visited
+    Returns:
+        An array with the community label of each node.
+    """
+
+    rng = np.random.RandomState(seed)
+    labels = np.arange(adjacency.shape[0])
+    adjacency = csr_matrix(adjacency, dtype=float)
+    two_m = adjacency.sum()
+    if two_m == 0:
+        return labels
+
+    while True:
+        community, moved = _louvain_moves(adjacency, two_m, rng)
+        if not moved:
+            return labels
+        community = np.unique(community, return_inverse=True)[1]
+        labels = community[labels]
+        members = csr_matrix((np.ones(len(community)), (np.arange(len(community)), community)))
+        adjacency = (members.T * adjacency * members).tocsr()
+
+
+def label_propagation_labels(adjacency, seed=None, max_iter=100):
+    """
+    Detect communities by label propagation: every node starts with its own label, then, visiting the nodes in random
+    order, each adopts the label most common among its neighbors (the smallest one on ties, keeping its own label if
+    that is among the most common), until no label changes.
+
+    Params:
+        adjacency......symmetric scipy sparse adjacency matrix
+        seed...........seed for the order in which nodes are visited
+        max_iter.......maximum number of passes over the nodes
+    Returns:
+        An array with the community label of each node.
+    """
+
+    rng = np.random.RandomState(seed)
+    adjacency = csr_matrix(adjacency)
+    labels = np.arange(adjacency.shape[0])
+    for _ in range(max_iter):
+        changed = False
+        for i in rng.permutation(adjacency.shape[0]):
+            neighbors = adjacency.indices[adjacency.indptr[i]:adjacency.indptr[i + 1]]
+            neighbors = neighbors[neighbors != i]
+            if not len(neighbors):
+                continue
+            counts = Counter(labels[neighbors].tolist())
+            most = max(counts.values())
+            if counts[labels[i]] == most:
+                continue
+            labels[i] = min(label for label, count in counts.items() if count == most)
+            changed = True
+        if not changed:
+            break
+    return np.unique(labels, return_inverse=True)[1]
+
+
+# A divisive Girvan-Newman run. Row i of merges holds the endpoints (indices into nodes) of the edge whose removal
+# made the i-th split; labels is the component of each node after the last split, and modularity[i] is the modularity
+# of the partition after i splits.
+Dendrogram = namedtuple('Dendrogram', ['nodes', 'labels', 'merges', 'modularity'])
+
+
+def girvan_newman_dendrogram(graph, max_clusters=None, workers=None):
+    """
+    Run Girvan-Newman once, removing the edge with the highest betweenness (see community_detection) until there are
+    max_clusters components or no edges are left, and record every split along the way.
+
+    The modularity of each level is kept up to date as components split: only the edges of the new, smaller side are
+    scanned, counting those inside it and those to the rest of its old component. Edges are removed from an
+    EdgeMaskedGraph view, so graph is left as it was.
+
+    >>> graph = nx.barbell_graph(4, 0)
+    >>> dendrogram = girvan_newman_dendrogram(graph)
+    >>> len(dendrogram.merges), graph.number_of_edges()
+    (7, 13)
+    >>> sorted(sorted(c.nodes()) for c in cut_dendrogram(graph, dendrogram))
+    [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+    Params:
+        graph..............networkx graph
+        max_clusters.......stop after this many components (default: run until every node is on its own)
+        workers............number of worker processes used to compute betweenness
+    Returns:
+        A Dendrogram, which cut_dendrogram turns into clusters.
+    """
+
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    degrees = np.array([graph.degree(node) for node in nodes], dtype=float)
+    two_m = max(degrees.sum(), 1.0)
+    labels = np.zeros(len(nodes), dtype=int)
+    for label, component in enumerate(nx.connected_components(graph)):
+        labels[[index[node] for node in component]] = label
+
+    # Every edge starts inside a component, so each one holds half its volume in internal edges.
+    volume = list(np.bincount(labels, weights=degrees))
+    internal = [vol / 2 for vol in volume]
+
+    def score(label):
+        return 2 * internal[label] / two_m - (volume[label] / two_m) ** 2
+
+    modularity = [sum(score(label) for label in range(len(volume)))]
+    merges = []
+    if max_clusters is None:
+        max_clusters = len(nodes)
+
+    H = EdgeMaskedGraph(graph)
+    credits = RootCredits(H, workers)
+    try:
+        edges_left = H.number_of_edges()
+        while len(volume) < max_clusters and edges_left > 0:
+            u, v = credits.best_edge()
+            credits.remove_edge(u, v)
+            edges_left -= 1
+            side = split_side(H, u, v)
+            if side is None:
+                continue
+
+            old, new = labels[index[u]], len(volume)
+            members = [index[node] for node in side]
+            labels[members] = new
+            inside = to_old = 0
+            for node in side:
+                for neighbor in graph.neighbors(node):
+                    label = labels[index[neighbor]]
+                    inside += label == new
+                    to_old += label == old
+
+            q = modularity[-1] - score(old)
+            volume.append(degrees[members].sum())
+            internal.append(inside / 2)
+            volume[old] -= volume[new]
+            internal[old] -= internal[new] + to_old
+            merges.append((index[u], index[v]))
+            modularity.append(q + score(old) + score(new))
+    finally:
+        credits.close()
+
+    return Dendrogram(nodes, labels, np.array(merges, dtype=int).reshape(-1, 2), np.array(modularity))
+
+
+def cut_dendrogram(graph, dendrogram, k=None):
+    """
+    Cut a dendrogram from girvan_newman_dendrogram into k clusters, or at the level with the highest modularity if k
+    is None.
+
+    The split edges recorded after a level join up the components it had, so the clusters are found by merging the
+    final components along those edges, without rerunning Girvan-Newman.
+
+    Params:
+        graph.............the networkx graph the dendrogram was built from
+        dendrogram........a Dendrogram
+        k.................number of clusters
+    Returns:
+        clusters - List of subgraphs of graph, one per cluster.
+    """
+
+    nodes, labels, merges, modularity = dendrogram
+    first = len(set(labels)) - len(merges)
+    if k is None:
+        k = first + int(np.argmax(modularity))
+    if not first <= k <= first + len(merges):
+        raise ValueError('the dendrogram has between %d and %d clusters, not %d' % (first, first + len(merges), k))
+
+    parent = {}
+    for i, label in enumerate(labels):
+        parent.setdefault(label, i)
+    parent = [parent[label] for label in labels]
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for u, v in merges[k - first:]:
+        parent[find(u)] = find(v)
+
+    groups = defaultdict(list)
+    for i, node in enumerate(nodes):
+        groups[find(i)].append(node)
+    return [graph.subgraph(group) for group in groups.values()]
 
 
 def get_clusters_info(clusters):
@@ -1,4 +1,5 @@
 #import networkx as nx
+import itertools
 import numpy as np
 
 
@@ -27,16 +28,95 @@ def jaccard_index(degrees, A, B):
     return np.sum(numerator) / ((1/np.sum(deno_a)) + (1/np.sum(deno_b)))
 
 
-def jaccard_wt(graph, node):
+class WeightedJaccardScorer:
+    """
+    Scores potential new edges with the weighted jaccard score, defined above, for any number of queries.
+
+    The graph is frozen once into arrays: node ids in sorted order, sorted neighbour ids per node (CSR indptr /
+    indices), each node's degree and the sum of its neighbours' degrees. A query then gathers the neighbours of its
+    neighbours, adding 1/degree of the shared neighbour to each candidate's numerator, and looks up both denominator
+    terms, without rebuilding any sets.
+
+    The scores are summed in a different order than jaccard_index sums them, so equal scores can differ in the last
+    bit. Both this and jaccard_wt round the scores to 9 decimals before breaking ties by name, so they rank tied
+    edges the same way.
+
+    >>> import networkx as nx
+    >>> graph = nx.Graph([(0, 2), (0, 7), (1, 2), (1, 3), (1, 4), (1, 6), (2, 5), (2, 8), (3, 4), (3, 7), (4, 5),
+    ...                   (4, 6), (4, 8), (5, 6), (6, 7), (7, 8)])
+    >>> scorer = WeightedJaccardScorer(graph)
+    >>> [(edge, round(float(score), 6)) for edge, score in scorer.score(4, 3)]
+    [((4, 2), 6.448276), ((4, 7), 6.448276), ((4, 0), 0.0)]
+    >>> all([edge for edge, score in scorer.score(node)] == [edge for edge, score in jaccard_wt(graph, node)]
+    ...     for node in graph)
+    True
+    >>> all(abs(a[1] - b[1]) < 1e-9 for node in graph for a, b in zip(scorer.score(node), jaccard_wt(graph, node)))
+    True
+    """
+
+    def __init__(self, graph):
+        self.nodes = sorted(graph.nodes())
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        neighbours = [sorted(self.index[ni] for ni in graph.neighbors(n)) for n in self.nodes]
+        self.degrees = np.array([graph.degree(n) for n in self.nodes], dtype=float)
+        self.indptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(row) for row in neighbours])
+        self.indices = np.array([ni for row in neighbours for ni in row], dtype=np.int64)
+        rows = np.repeat(np.arange(len(self.nodes)), np.diff(self.indptr))
+        self.neighbour_degrees = np.bincount(rows, weights=self.degrees[self.indices], minlength=len(self.nodes))
+
+    def score(self, node, k=None):
+        """
+        Args:
+        node.....a node to score potential new edges for.
+        k........if given, only return the k highest scoring edges.
+        Returns:
+        The same list of ((node, ni), score) tuples as jaccard_wt.
+        """
+        i = self.index[node]
+        neighbours = self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+        # Gather the neighbours of each neighbour, weighted by 1/degree of the neighbour they are reached through
+        starts, ends = self.indptr[neighbours], self.indptr[neighbours + 1]
+        counts = ends - starts
+        slots = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        reached = self.indices[slots]
+        weights = np.repeat(1 / self.degrees[neighbours], counts)
+
+        candidates, position = np.unique(reached, return_inverse=True)
+        numerator = np.bincount(position, weights=weights, minlength=len(candidates))
+        keep = (candidates != i) & ~np.isin(candidates, neighbours)
+        candidates, numerator = candidates[keep], numerator[keep]
+        with np.errstate(divide='ignore'):
+            denominator = 1 / self.neighbour_degrees[i] + 1 / self.neighbour_degrees[candidates]
+        scores = numerator / denominator
+
+        # Node ids are in sorted order, so ties are broken by name
+        order = np.lexsort((candidates, -np.round(scores, 9)))[0:k]
+        output = [((node, self.nodes[c]), s) for c, s in zip(candidates[order], scores[order])]
+
+        # Every other node that is not already a neighbour scores 0; they fill the remaining slots alphabetically
+        remaining = len(self.nodes) if k is None else k - len(output)
+        if remaining > 0:
+            excluded = set(candidates.tolist()) | set(neighbours.tolist()) | {i}
+            zeros = (c for c in range(len(self.nodes)) if c not in excluded)
+            output += [((node, self.nodes[c]), 0.0) for c in itertools.islice(zeros, remaining)]
+
+        return output
+
+
+def jaccard_wt(graph, node, k=None):
     """
     The weighted jaccard score, defined above.
     Args:
     graph....a networkx graph
     node.....a node to score potential new edges for.
+    k........if given, only return the k highest scoring edges.
     Returns:
     A list of ((node, ni), score) tuples, representing the
               score assigned to edge (node, ni)
               (note the edge order)
+    To score many nodes of the same graph, build a WeightedJaccardScorer once instead.
     """
     # Find all nodes that are not already neighbours of node
     candidate_nodes = set(graph.nodes()) - set(graph.neighbors(node)) - {node}
@@ -51,8 +131,9 @@ def jaccard_wt(graph, node):
     # and create a list of tuples as required
     output = [((node, ni), jaccard_index(degrees, neigh_node, set(graph.neighbors(ni)))) for ni in candidate_nodes]
 
-    # return the sorted tuples based on the higher score first
-    return sorted(output, key=lambda x: (-x[1], x[0][1]))
+    # return the sorted tuples based on the higher score first (rounded, so equal scores tie whatever order the
+    # neighbours were summed in)
+    return sorted(output, key=lambda x: (-round(x[1], 9), x[0][1]))[0:k]
 
 
 # #Main function is written to verify if this program works fine with respect to the requirement.